@@ -0,0 +1,119 @@
+"""
+Compare the sentence encoder backends (torch, onnx, onnx-int8) on the bundled
+corpus: model load time, peak RAM, encode latency over every chunk of every
+policy, and whether the pipeline still picks the same substrings as torch.
+
+Each backend runs in its own interpreter so RAM numbers don't mix. Uses the
+existing OCR text in Files/Policer; OCR is not part of this benchmark.
+
+    python backend/benchmarks/encoders.py [--backends torch onnx onnx-int8]
+"""
+from pathlib import Path
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+TEXT_DIR = Path("Files/Policer")
+TRUE_DIR = Path("Files/True-JSONs")
+DEFAULT_REPORT = Path("Files/Benchmarks/encoders-report.json")
+
+def peak_rss_mb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:  # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+
+def run_backend(backend):
+    """Runs inside the child interpreter; returns this backend's measurements."""
+    import main as pipeline
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    model = pipeline.get_model(backend)
+    load_seconds = time.perf_counter() - start
+
+    documents = []
+    for json_path in sorted(TRUE_DIR.glob("*.json")):
+        text_path = TEXT_DIR / f"{json_path.stem}.txt"
+        if text_path.exists():
+            values = pipeline.load_values(json_path)
+            documents.append((json_path.stem, values, text_path.read_text(encoding="utf-8")))
+
+    # Warm-up so one-off graph/session initialisation isn't counted as encode time
+    pipeline.encode_unique(["opvarmning"], model)
+
+    encode_seconds = 0.0
+    texts_encoded = 0
+    matches = {}
+    for stem, values, text in documents:
+        queries_to_run, group_mapping = pipeline.build_queries(*values)
+        start = time.perf_counter()
+        query_embeddings, embedded = pipeline.embed_batch([(text, queries_to_run)], model)[0]
+        encode_seconds += time.perf_counter() - start
+        texts_encoded += len(queries_to_run) + sum(len(chunks) for chunks, _ in embedded.values())
+        config_results = pipeline.run_configs(queries_to_run, query_embeddings, embedded)
+        output_data = pipeline.build_output(values, queries_to_run, group_mapping, config_results,
+                                             pipeline.match_area(text, values))
+        matches[stem] = {row["id"]: row["received"] for row in output_data}
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 3),
+        "encode_seconds": round(encode_seconds, 3),
+        "texts_encoded": texts_encoded,
+        "ms_per_text": round(encode_seconds / texts_encoded * 1000, 3) if texts_encoded else None,
+        "model_ram_mb": round(peak_rss_mb() - rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "matches": matches,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--report", type=Path, default=DEFAULT_REPORT)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child), ensure_ascii=False))
+        return
+
+    results = []
+    for backend in args.backends:
+        proc = subprocess.run([sys.executable, __file__, "--child", backend], capture_output=True, text=True, encoding="utf-8")
+        if proc.returncode != 0:
+            print(f"{backend}: failed\n{proc.stderr.strip()}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    baseline = next((r for r in results if r["backend"] == "torch"), results[0] if results else None)
+    print(f"{'backend':<10} {'load s':>8} {'ms/text':>8} {'model MB':>9} {'peak MB':>8} {'same picks':>11}")
+    for result in results:
+        changed = [
+            f"{stem} {field}: {baseline['matches'][stem][field]!r} -> {received!r}"
+            for stem, fields in result["matches"].items()
+            for field, received in fields.items()
+            if baseline["matches"].get(stem, {}).get(field) != received
+        ]
+        total = sum(len(fields) for fields in result["matches"].values())
+        result["changed_matches"] = changed
+        print(f"{result['backend']:<10} {result['load_seconds']:>8.2f} {result['ms_per_text']:>8.2f} "
+              f"{result['model_ram_mb']:>9.0f} {result['peak_rss_mb']:>8.0f} {total - len(changed):>5}/{total:<5}")
+        for line in changed:
+            print(f"    {line}")
+
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "baseline": baseline and baseline["backend"],
+                   "backends": results}, f, ensure_ascii=False, indent=4)
+    print(f"Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
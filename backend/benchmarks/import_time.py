@@ -0,0 +1,81 @@
+"""
+Import-time check for the backend modules. Each module is imported in a fresh
+interpreter; the script fails if an import takes longer than the budget or
+pulls in a heavy library that should only load when its stage runs.
+
+    python backend/benchmarks/import_time.py [--budget-ms 400]
+"""
+from pathlib import Path
+import argparse
+import json
+import subprocess
+import sys
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# (label, how to import it)
+MODULES = [
+    ("main", "import main"),
+    ("srv", "import srv"),
+    ("retrieval", "import retrieval"),
+    ("jobs", "import jobs"),
+    ("progress", "import progress"),
+    ("metrics", "import metrics"),
+    ("encoders", "import encoders"),
+    ("numeric", "import numeric"),
+    ("chunking", "import chunking"),
+    ("trigram_index", "import trigram_index"),
+    ("models.tesseractocr", "from models import tesseractocr"),
+    ("models.ocr_cache", "from models import ocr_cache"),
+    ("models.ocr_engines", "from models import ocr_engines"),
+    ("models.preprocessing", "from models import preprocessing"),
+    ("models.word_table", "from models import word_table"),
+    ("models/llama.py", "import runpy; runpy.run_path('models/llama.py', run_name='llama')"),
+]
+
+HEAVY_MODULES = [
+    "torch", "sentence_transformers", "faiss", "pandas", "pytesseract", "pdf2image",
+    "PIL", "easyocr", "cv2", "requests", "psutil", "GPUtil", "onnxruntime", "tesserocr",
+]
+
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(statement):
+    code = PROBE.format(backend=str(BACKEND_DIR), statement=statement, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=BACKEND_DIR)
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "unknown error"
+        return {"error": last_line}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=400.0)
+    args = parser.parse_args()
+
+    failed = False
+    for label, statement in MODULES:
+        result = measure(statement)
+        if "error" in result:
+            # A missing third-party dependency is an environment problem, not an import-time regression
+            print(f"{label:<22} skipped ({result['error']})")
+            continue
+        problems = []
+        if result["ms"] > args.budget_ms:
+            problems.append(f"over budget of {args.budget_ms:.0f} ms")
+        if result["heavy"]:
+            problems.append("loads " + ", ".join(result["heavy"]))
+        failed |= bool(problems)
+        print(f"{label:<22} {result['ms']:8.1f} ms  {'FAIL: ' + '; '.join(problems) if problems else 'ok'}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
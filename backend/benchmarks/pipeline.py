@@ -0,0 +1,203 @@
+"""
+Accuracy-and-latency benchmark over the bundled Files corpus.
+
+Runs OCR and matching for every policy in Files/policer-Raw (against both
+Files/True-JSONs and Files/Error-JSONs) and Files/policer-cursed (against the
+true values of the policy it was made from). Each stage is timed, and every
+field is scored:
+  - true values: the field is correct if the received text holds the expected value
+  - error values: the field is correct if the pipeline flags it (no exact match)
+
+Every combination of OCR engine, DPI, preprocessing, chunking configs, TOP_K,
+cascade mode, area matcher and trigram lookup is run, and a machine-readable
+report is written so performance changes can be checked for accuracy
+regressions.
+
+    python backend/benchmarks/pipeline.py --engines tesseract easyocr --dpi 150 200
+    python backend/benchmarks/pipeline.py --preprocess none grayscale grayscale,deskew,binarize
+    python backend/benchmarks/pipeline.py --top-k 10 20 --configs all 3:1 50:25
+    python backend/benchmarks/pipeline.py --cascade on off --area numeric semantic --literal on off
+"""
+from pathlib import Path
+import argparse
+import itertools
+import json
+import os
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import main as pipeline
+from models import tesseractocr, ocr_engines, preprocessing
+
+RAW_DIR = Path("Files/policer-Raw")
+CURSED_DIR = Path("Files/policer-cursed")
+TRUE_DIR = Path("Files/True-JSONs")
+ERROR_DIR = Path("Files/Error-JSONs")
+DEFAULT_REPORT = Path("Files/Benchmarks/pipeline-report.json")
+
+UNIT_TOKENS = {"m2", "m²", "m", "kvm"}
+
+OCR_ENGINES = {
+    "tesseract": ocr_engines.TesseractEngine,
+    # A tesseract process per page, to compare against the reused tesserocr engines
+    "tesseract-cli": lambda: ocr_engines.TesseractEngine(api="pytesseract"),
+    "easyocr": ocr_engines.EasyOCREngine,
+}
+
+def discover_datasets():
+    """Returns {dataset: [(pdf_path, ground_truth_path), ...]}."""
+    datasets = {"raw-true": [], "raw-error": [], "cursed-true": []}
+    stems = sorted(p.stem for p in TRUE_DIR.glob("*.json"))
+    for stem in stems:
+        pdf_path = RAW_DIR / f"{stem}.pdf"
+        if not pdf_path.exists():
+            continue
+        datasets["raw-true"].append((pdf_path, TRUE_DIR / f"{stem}.json"))
+        if (ERROR_DIR / f"{stem}.json").exists():
+            datasets["raw-error"].append((pdf_path, ERROR_DIR / f"{stem}.json"))
+    for pdf_path in sorted(CURSED_DIR.glob("*.pdf")):
+        # Cursed variants are named <original stem>-<distortion>.pdf
+        matches = [stem for stem in stems if pdf_path.stem.startswith(stem + "-")]
+        if matches:
+            datasets["cursed-true"].append((pdf_path, TRUE_DIR / f"{max(matches, key=len)}.json"))
+    return datasets
+
+def normalize_value(text):
+    tokens = str(text).lower().translate(str.maketrans("", "", string.punctuation)).split()
+    return sorted(token for token in tokens if token not in UNIT_TOKENS)
+
+def field_correct(row, expect_match):
+    matched = bool(row["received"]) and normalize_value(row["expected"]) == normalize_value(row["received"])
+    return matched if expect_match else not matched
+
+def parse_config(value):
+    if value == "all":
+        return list(pipeline.CONFIGS)
+    chunk_size, overlap = value.split(":")
+    return [(int(chunk_size), int(overlap))]
+
+def summarize(times):
+    return {
+        "total": round(sum(times), 4),
+        "mean": round(sum(times) / len(times), 4) if times else 0.0,
+        "max": round(max(times), 4) if times else 0.0,
+    }
+
+def run_variant(engine, dpi, preprocess, configs, top_k, cascade, area, literal, datasets, ocr_texts, model):
+    pipeline.TOP_K = top_k
+    numeric_area = area == "numeric"
+    # prepare: queries and the trigram index step; match: search, area matcher and output rows
+    stage_times = {"prepare": [], "embed": [], "match": []}
+    scores = {}
+    documents = []
+    for dataset, pairs in datasets.items():
+        expect_match = not dataset.endswith("-error")
+        correct = total = 0
+        per_field = {}
+        for pdf_path, ground_truth in pairs:
+            text = ocr_texts[pdf_path]
+            values = pipeline.load_values(ground_truth)
+
+            start = time.perf_counter()
+            doc = pipeline.start_matching(values, text, literal=literal, numeric_area=numeric_area)
+            stage_times["prepare"].append(time.perf_counter() - start)
+
+            query_embeddings = embedded = None
+            if doc["search_queries"]:
+                start = time.perf_counter()
+                query_embeddings, embedded = pipeline.embed_batch([(doc["tokens"], doc["search_queries"])], model,
+                                                                  configs=configs)[0]
+                stage_times["embed"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            output_data = pipeline.finish_matching(doc, query_embeddings, embedded, cascade=cascade, configs=configs)
+            stage_times["match"].append(time.perf_counter() - start)
+
+            rows = []
+            for row in output_data:
+                ok = field_correct(row, expect_match)
+                correct += ok
+                total += 1
+                field = per_field.setdefault(row["id"], {"correct": 0, "total": 0})
+                field["correct"] += ok
+                field["total"] += 1
+                rows.append({**row, "correct": ok})
+            documents.append({"dataset": dataset, "pdf": pdf_path.name, "ground_truth": Path(ground_truth).name, "fields": rows})
+        scores[dataset] = {
+            "documents": len(pairs),
+            "field_accuracy": round(correct / total, 4) if total else None,
+            "fields": per_field,
+        }
+    return {
+        "engine": engine,
+        "dpi": dpi,
+        "preprocess": preprocess,
+        "configs": [list(config) for config in configs],
+        "top_k": top_k,
+        "cascade": cascade,
+        "area": area,
+        "literal": literal,
+        "scores": scores,
+        "stage_seconds": {stage: summarize(times) for stage, times in stage_times.items()},
+        "documents": documents,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", nargs="+", default=["tesseract"], choices=sorted(OCR_ENGINES))
+    parser.add_argument("--dpi", nargs="+", type=int, default=[tesseractocr.RASTER_DPI])
+    parser.add_argument("--preprocess", nargs="+", default=[preprocessing.describe(preprocessing.parse_steps())],
+                        help='comma-separated preprocessing steps per variant, or "none"')
+    parser.add_argument("--configs", nargs="+", default=["all"], help='"all" or chunk_size:overlap')
+    parser.add_argument("--top-k", nargs="+", type=int, default=[pipeline.TOP_K])
+    parser.add_argument("--cascade", nargs="+", choices=["on", "off"], default=["on" if pipeline.CASCADE else "off"])
+    parser.add_argument("--area", nargs="+", choices=["numeric", "semantic"],
+                        default=["numeric" if pipeline.NUMERIC_AREA else "semantic"])
+    parser.add_argument("--literal", nargs="+", choices=["on", "off"], default=["on" if pipeline.LITERAL_INDEX else "off"])
+    parser.add_argument("--use-cache", action="store_true", help="allow OCR cache hits (OCR timings are then meaningless)")
+    parser.add_argument("--report", type=Path, default=DEFAULT_REPORT)
+    args = parser.parse_args()
+
+    datasets = discover_datasets()
+    pdf_paths = sorted({pdf for pairs in datasets.values() for pdf, _ in pairs})
+    model = pipeline.get_model()
+    variants = []
+
+    for engine, dpi, preprocess in itertools.product(args.engines, args.dpi, args.preprocess):
+        # OCR each PDF once per engine/DPI/preprocessing; every matching variant reuses the text
+        ocr_texts = {}
+        ocr_times = []
+        with tempfile.TemporaryDirectory() as text_dir:
+            for pdf_path in pdf_paths:
+                start = time.perf_counter()
+                text_path = tesseractocr.process_pdf(pdf_path, Path(text_dir), dpi=dpi, use_cache=args.use_cache,
+                                                     engine=OCR_ENGINES[engine](), preprocess=preprocess)
+                ocr_times.append(time.perf_counter() - start)
+                ocr_texts[pdf_path] = Path(text_path).read_text(encoding="utf-8")
+
+        for config_arg, top_k, cascade, area, literal in itertools.product(
+                args.configs, args.top_k, args.cascade, args.area, args.literal):
+            variant = run_variant(engine, dpi, preprocess, parse_config(config_arg), top_k, cascade == "on", area, literal == "on",
+                                  datasets, ocr_texts, model)
+            variant["stage_seconds"]["ocr"] = summarize(ocr_times)
+            variants.append(variant)
+            accuracy = ", ".join(f"{name}={s['field_accuracy']}" for name, s in variant["scores"].items())
+            print(f"{engine} dpi={dpi} preprocess={preprocess} configs={config_arg} top_k={top_k} cascade={cascade} area={area} literal={literal}: {accuracy} "
+                  f"(ocr mean {variant['stage_seconds']['ocr']['mean']:.2f}s, "
+                  f"match mean {variant['stage_seconds']['match']['mean']:.3f}s)")
+
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump({
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "cpu_count": os.cpu_count(),
+            "datasets": {name: len(pairs) for name, pairs in datasets.items()},
+            "variants": variants,
+        }, f, ensure_ascii=False, indent=4)
+    print(f"Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
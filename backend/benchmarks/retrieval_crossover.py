@@ -0,0 +1,56 @@
+"""
+Time NumPy brute force against FAISS IndexFlatL2 (including index construction)
+for growing chunk counts, to pick retrieval.FAISS_MIN_CHUNKS.
+
+    python backend/benchmarks/retrieval_crossover.py
+"""
+from pathlib import Path
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import retrieval
+
+DIM = 768          # xlm-r-100langs-bert-base embedding size
+N_QUERIES = 8      # queries per document after the areaSize expansion
+TOP_K = 20
+# Runs past the default FAISS_MIN_CHUNKS (200000); the largest size needs about 1.2 GB
+CHUNK_COUNTS = [100, 500, 1000, 5000, 10000, 50000, 100000, 200000, 400000]
+REPEATS = 5
+
+def best_time(fn, *args):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((N_QUERIES, DIM), dtype=np.float32)
+    crossover = None
+    print(f"{'chunks':>8} {'numpy ms':>10} {'faiss ms':>10}")
+    for n_chunks in CHUNK_COUNTS:
+        chunks = rng.standard_normal((n_chunks, DIM), dtype=np.float32)
+        top_k = min(TOP_K, n_chunks)
+
+        np_idxs = retrieval.numpy_search(chunks, queries, top_k)[1]
+        faiss_idxs = retrieval.faiss_search(chunks, queries, top_k)[1]
+        assert (np_idxs == faiss_idxs).all(), "backends disagree"
+
+        numpy_ms = best_time(retrieval.numpy_search, chunks, queries, top_k) * 1000
+        faiss_ms = best_time(retrieval.faiss_search, chunks, queries, top_k) * 1000
+        print(f"{n_chunks:>8} {numpy_ms:>10.2f} {faiss_ms:>10.2f}")
+        if crossover is None and faiss_ms < numpy_ms:
+            crossover = n_chunks
+
+    if crossover is None:
+        print(f"\nNumPy was faster at every size up to {CHUNK_COUNTS[-1]} chunks; "
+              f"leave FAISS opt-in (RETRIEVAL_BACKEND=faiss)")
+    else:
+        print(f"\nFAISS becomes faster at about {crossover} chunks (FAISS_MIN_CHUNKS={retrieval.FAISS_MIN_CHUNKS})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import string
+import numpy as np
+
+# Overlapping word chunks as spans into one shared token list. A document is
+# tokenized once (tokenize); every config's chunks are then just (start, end)
+# token spans, and a chunk's text is only built when it goes to the encoder.
+# The tokens' character offsets map a chunk or a match back into the text.
+
+# Code points str.split() splits on (all of them are below U+3001)
+_whitespace = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint32)
+_punctuation_table = str.maketrans('', '', string.punctuation)
+
+class Tokens:
+    """
+    The whitespace-separated tokens of `text` (the same as text.split()), with
+    each token's [start, end) character offsets in `text`.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.words = text.split()
+        # Offsets come from one vectorized pass over the code points: a token
+        # starts where whitespace turns into non-whitespace and ends where it turns back
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        in_token = np.concatenate(([False], ~np.isin(codes, _whitespace), [False])).astype(np.int8)
+        edges = np.diff(in_token)
+        self.starts = np.flatnonzero(edges == 1)
+        self.ends = np.flatnonzero(edges == -1)
+        self._clean_words = None
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def clean_words(self):
+        """The tokens without punctuation, computed on first use."""
+        if self._clean_words is None:
+            self._clean_words = [remove_punctuation(word) for word in self.words]
+        return self._clean_words
+
+    def join(self, start, end):
+        return " ".join(self.words[start:end])
+
+    def char_span(self, start, end):
+        """Character offsets [char_start, char_end) in the text of the (non-empty) tokens [start, end)."""
+        return int(self.starts[start]), int(self.ends[end - 1])
+
+def remove_punctuation(text):
+    return text.translate(_punctuation_table)
+
+def tokenize(text):
+    """`text` as Tokens; Tokens are returned as they are."""
+    return text if isinstance(text, Tokens) else Tokens(text)
+
+def chunk_spans(n_tokens, chunk_size, overlap):
+    """
+    (start, end) token spans of chunk_size tokens, each starting
+    chunk_size - overlap tokens after the previous one, as an (n, 2) array.
+    """
+    starts = np.arange(0, n_tokens, chunk_size - overlap, dtype=np.int64)
+    return np.stack([starts, np.minimum(starts + chunk_size, n_tokens)], axis=1)
+
+class Chunks:
+    """One config's chunks of a document: token spans into the document's shared Tokens."""
+
+    def __init__(self, tokens, chunk_size, overlap):
+        self.tokens = tokens
+        self.spans = chunk_spans(len(tokens), chunk_size, overlap)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def texts(self):
+        """Every chunk's text (tokens joined by single spaces), for the encoder."""
+        return [self.tokens.join(start, end) for start, end in self.spans.tolist()]
+
+    def excerpt(self, i):
+        """Chunk `i` as it appears in the document text, sliced by its character offsets."""
+        start, end = self.spans[i]
+        char_start, char_end = self.tokens.char_span(int(start), int(end))
+        return self.tokens.text[char_start:char_end]
@@ -0,0 +1,47 @@
+from pathlib import Path
+import os
+
+# Sentence encoder backends for the matching stage:
+#   torch      - the PyTorch SentenceTransformer (default)
+#   onnx       - the same model exported to ONNX Runtime
+#   onnx-int8  - the ONNX export with dynamic int8 quantization
+# ONNX exports are written once to ENCODER_CACHE_DIR and loaded from there afterwards.
+# The ONNX backends need `pip install sentence-transformers[onnx]`.
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+ENCODER_BACKEND = os.environ.get("ENCODER_BACKEND", "torch")
+ENCODER_CACHE_DIR = Path(os.environ.get("ENCODER_CACHE_DIR", "Files/Models"))
+# Instruction set the int8 model is tuned for: arm64, avx2, avx512 or avx512_vnni
+QUANTIZATION_CONFIG = os.environ.get("ONNX_QUANTIZATION_CONFIG", "avx2")
+
+def export_dir(model_name, backend):
+    return ENCODER_CACHE_DIR / model_name.replace("/", "__") / backend
+
+def quantized_file_name():
+    return f"onnx/model_qint8_{QUANTIZATION_CONFIG}.onnx"
+
+def load_encoder(model_name, backend=None):
+    """Load `model_name` on the given backend, exporting and caching the ONNX variants on first use."""
+    from sentence_transformers import SentenceTransformer
+
+    backend = backend or ENCODER_BACKEND
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend: {backend} (expected one of {', '.join(ENCODER_BACKENDS)})")
+    if backend == "torch":
+        return SentenceTransformer(model_name, device="cpu")
+
+    onnx_dir = export_dir(model_name, "onnx")
+    if not (onnx_dir / "onnx" / "model.onnx").exists():
+        print(f"Exporting {model_name} to ONNX in {onnx_dir}...")
+        model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+        model.save_pretrained(str(onnx_dir))
+    if backend == "onnx":
+        return SentenceTransformer(str(onnx_dir), backend="onnx", device="cpu")
+
+    if not (onnx_dir / quantized_file_name()).exists():
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        print(f"Quantizing {model_name} to int8 ({QUANTIZATION_CONFIG})...")
+        model = SentenceTransformer(str(onnx_dir), backend="onnx", device="cpu")
+        export_dynamic_quantized_onnx_model(model, QUANTIZATION_CONFIG, str(onnx_dir))
+    return SentenceTransformer(str(onnx_dir), backend="onnx", device="cpu",
+                               model_kwargs={"file_name": quantized_file_name()})
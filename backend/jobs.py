@@ -0,0 +1,142 @@
+from collections import OrderedDict, deque
+import concurrent.futures
+import os
+import threading
+import time
+import uuid
+import metrics
+
+# Bounded pools that run extraction jobs. Requests for a document that is
+# already queued or running join that job instead of starting another one.
+# Batch jobs get their own pool, so a long batch never takes the slot that
+# interactive single-document requests run in.
+MAX_CONCURRENT_JOBS = int(os.environ.get("EXTRACTION_WORKERS", "1"))
+MAX_CONCURRENT_BATCHES = int(os.environ.get("BATCH_WORKERS", "1"))
+# How many finished jobs are kept around for polling
+MAX_FINISHED_JOBS = 1000
+
+_executors = {
+    "extraction": concurrent.futures.ThreadPoolExecutor(
+        max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="extraction"
+    ),
+    "batch": concurrent.futures.ThreadPoolExecutor(
+        max_workers=MAX_CONCURRENT_BATCHES, thread_name_prefix="batch"
+    ),
+}
+_lock = threading.Lock()
+_jobs = OrderedDict()
+_in_flight = {}
+_recent_waits = deque(maxlen=100)
+
+def submit(key, fn, *args, queue="extraction"):
+    """
+    Queue fn(*args) as a job for `key` (e.g. a document stem) on the
+    "extraction" or "batch" pool. If a job for the same key is still queued or
+    running, that job is returned instead. Returns (job_id, joined).
+    """
+    with _lock:
+        if key in _in_flight:
+            return _in_flight[key], True
+        job_id = uuid.uuid4().hex
+        job = {
+            "id": job_id,
+            "key": key,
+            "queue": queue,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        _jobs[job_id] = job
+        _in_flight[key] = job_id
+        job["future"] = _executors[queue].submit(_run, job, fn, args)
+        _prune()
+        return job_id, False
+
+def record_done(key, result):
+    """Record a job for `key` that finished without running (e.g. served from stored output). Returns its id."""
+    with _lock:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "id": job_id,
+            "key": key,
+            "queue": "extraction",
+            "status": "done",
+            "submitted_at": now,
+            "started_at": now,
+            "finished_at": now,
+            "result": result,
+            "error": None,
+        }
+        _prune()
+        return job_id
+
+def _run(job, fn, args):
+    with _lock:
+        job["status"] = "running"
+        job["started_at"] = time.time()
+        _recent_waits.append(job["started_at"] - job["submitted_at"])
+    try:
+        # Stage timings are traced under the job's id (see /jobs/<id>/trace)
+        with metrics.job(job["id"]):
+            result = fn(*args)
+        with _lock:
+            job["status"] = "done"
+            job["result"] = result
+        return result
+    except Exception as e:
+        with _lock:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        raise
+    finally:
+        with _lock:
+            job["finished_at"] = time.time()
+            _in_flight.pop(job["key"], None)
+
+def _prune():
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in ("done", "failed")]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[job_id]
+
+def get(job_id):
+    """Public view of a job, or None if the id is unknown."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        view = {k: v for k, v in job.items() if k != "future"}
+    now = time.time()
+    view["wait_seconds"] = round((view["started_at"] or now) - view["submitted_at"], 3)
+    if view["started_at"]:
+        view["run_seconds"] = round((view["finished_at"] or now) - view["started_at"], 3)
+    return view
+
+def wait(job_id, timeout=None):
+    """Block until the job finishes and return its result (re-raises its exception)."""
+    with _lock:
+        job = _jobs[job_id]
+        if "future" not in job:
+            return job["result"]
+        future = job["future"]
+    return future.result(timeout=timeout)
+
+def stats():
+    with _lock:
+        statuses = [job["status"] for job in _jobs.values()]
+        waits = list(_recent_waits)
+        oldest_queued = min(
+            (job["submitted_at"] for job in _jobs.values() if job["status"] == "queued"), default=None
+        )
+    return {
+        "max_concurrent": MAX_CONCURRENT_JOBS,
+        "max_concurrent_batches": MAX_CONCURRENT_BATCHES,
+        "queue_depth": statuses.count("queued"),
+        "running": statuses.count("running"),
+        "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+        "max_wait_seconds": round(max(waits), 3) if waits else 0.0,
+        "oldest_queued_seconds": round(time.time() - oldest_queued, 3) if oldest_queued else 0.0,
+    }
@@ -1,27 +1,78 @@
 ﻿import re
 import json
 import numpy as np
-import string
-import faiss
-from sentence_transformers import SentenceTransformer
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 import concurrent.futures
+import contextvars
+import threading
 import os
+import time
+import argparse
 import glob
-from models import tesseractocr
+from models import tesseractocr, word_table
+import retrieval
+import progress
+import metrics
+import encoders
+import numeric
+import chunking
+import trigram_index
 from pathlib import Path
 from tqdm import tqdm
 
 CONFIGS = [
-    (3, 1),   # (chunk_size, overlap)
+    (3, 1),   # (chunk_size, overlap), cheapest first
     (50, 25),
     (100, 50)
 ]
 TOP_K = 20
+# Cascade mode: search the configs in CONFIGS order and stop for a field group
+# once one of its queries scores CASCADE_THRESHOLD or more. Only still
+# unresolved groups are searched (and, for single documents, embedded) in the
+# next config. With the default threshold of 100 the picks are the same as
+# searching every config.
+CASCADE = os.environ.get("SEARCH_CASCADE", "1") == "1"
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", "100"))
+# Match areaSize with the single-pass number/unit extractor (numeric.py) instead
+# of six embedded queries searched in every config
+NUMERIC_AREA = os.environ.get("NUMERIC_AREA", "1") == "1"
+# Look the literal field groups up in the document's trigram index first
+# (trigram_index.py); only groups it can't resolve go to the embedding search
+LITERAL_INDEX = os.environ.get("LITERAL_INDEX", "1") == "1"
+LITERAL_GROUPS = ("street_name+house_number", "postal_code+postal_district")
+# Key of the trigram index's results in config_results
+LITERAL = "trigram"
+ENCODE_BATCH_SIZE = 64
+# Batch mode: OCR threads, and how many OCR'd documents are embedded per model batch
+BATCH_OCR_WORKERS = int(os.environ.get("BATCH_OCR_WORKERS", "4"))
+BATCH_DOCUMENTS = int(os.environ.get("BATCH_DOCUMENTS", "32"))
+# Threads rapidfuzz may use to score candidate windows (-1 = all cores)
+FUZZY_WORKERS = int(os.environ.get("FUZZY_WORKERS", "-1"))
+MODEL_NAME = "sentence-transformers/xlm-r-100langs-bert-base-nli-stsb-mean-tokens"
+
+_models = {}
+_model_lock = threading.Lock()
+
+def get_model(backend=None):
+    """
+    Return the shared sentence encoder for `backend` (default: ENCODER_BACKEND,
+    see encoders.py), loading it on first use.
+    The model stays in memory for the lifetime of the process, so a long-lived
+    caller (e.g. srv.py) only pays the load cost once.
+    """
+    backend = backend or encoders.ENCODER_BACKEND
+    if backend not in _models:
+        with _model_lock:
+            if backend not in _models:
+                _models[backend] = encoders.load_encoder(MODEL_NAME, backend)
+    return _models[backend]
 
 def load_json(json_path):
     with open(json_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
+    return parse_ground_truth(data)
+
+def parse_ground_truth(data):
     address = data.get("address", {})
     return (
         address.get("streetName", ""),
@@ -31,97 +82,120 @@ def load_json(json_path):
         data.get("areaSize", "")
     )
 
-def chunk_text_with_overlap(text, chunk_size, overlap):
-    words = text.split()
-    chunks = []
-    i = 0
-    while i < len(words):
-        chunk = " ".join(words[i:i + chunk_size])
-        chunks.append(chunk)
-        i += chunk_size - overlap
-    return chunks
-
-def create_faiss_index(chunks, model):
-    embeddings = model.encode(chunks, show_progress_bar=False)
-    embeddings = np.array(embeddings, dtype='float32')
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-    return index
-
-def search_faiss(query, model, index, chunks, top_k=TOP_K):
-    query_emb = model.encode([query], show_progress_bar=False).astype('float32')
-    distances, idxs = index.search(query_emb, top_k)
+def encode_unique(texts, model):
+    """
+    Encode `texts` with one batched model call, embedding each distinct string only once.
+    Returns a float32 array with one row per input text.
+    """
+    unique_texts = list(dict.fromkeys(texts))
+    with metrics.timed("embed"):
+        embeddings = model.encode(unique_texts, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False)
+    embeddings = np.asarray(embeddings, dtype='float32')
+    row_of = {t: i for i, t in enumerate(unique_texts)}
+    return embeddings[[row_of[t] for t in texts]]
+
+def embed_batch(documents, model, configs=None):
+    """
+    Embed the queries and the chunks of every config (default CONFIGS) for one or more documents
+    with a single batched model call. `documents` is a list of (text, queries_to_run);
+    the text may already be chunking.Tokens, so a document is only tokenized once.
+    Returns one (query_embeddings, {config: (chunks, embeddings)}) pair per document,
+    chunks being chunking.Chunks. Chunk texts are only built for the encoder.
+    """
+    configs = CONFIGS if configs is None else configs
+    layout = []
+    all_texts = []
+    for text, queries_to_run in documents:
+        queries = [query for _, query in queries_to_run]
+        with metrics.timed("chunk"):
+            tokens = chunking.tokenize(text)
+            chunks_by_config = {config: chunking.Chunks(tokens, *config) for config in configs}
+        layout.append((queries, chunks_by_config))
+        all_texts.extend(queries)
+        for config in configs:
+            all_texts.extend(chunks_by_config[config].texts())
+
+    all_embeddings = encode_unique(all_texts, model)
+
+    embedded_documents = []
+    offset = 0
+    for queries, chunks_by_config in layout:
+        query_embeddings = all_embeddings[offset:offset + len(queries)]
+        offset += len(queries)
+        embedded = {}
+        for config in configs:
+            chunks = chunks_by_config[config]
+            embedded[config] = (chunks, all_embeddings[offset:offset + len(chunks)])
+            offset += len(chunks)
+        embedded_documents.append((query_embeddings, embedded))
+    return embedded_documents
+
+def search_chunks(query_embeddings, chunk_embeddings, top_k=TOP_K):
+    """Return, for every query, a list of (chunk_index, distance) for its top_k nearest chunks."""
+    with metrics.timed("search"):
+        distances, idxs = retrieval.search(chunk_embeddings, query_embeddings, top_k)
     results = []
-    for dist, chunk_idx in zip(distances[0], idxs[0]):
-        results.append((chunks[chunk_idx], dist))
+    for query_distances, query_idxs in zip(distances, idxs):
+        results.append([(int(chunk_idx), dist) for dist, chunk_idx in zip(query_distances, query_idxs)])
     return results
 
-def remove_punctuation(text):
-    translator = str.maketrans('', '', string.punctuation)
-    return text.translate(translator)
-
-def find_best_substring_in_chunk(query, chunk):
-    query_clean = remove_punctuation(query)
-    query_tokens = query_clean.split()
-    query_len = len(query_tokens)
-    best_substring = None
-    best_score = -1
-    chunk_tokens = chunk.split()
-    for start_idx in range(len(chunk_tokens) - query_len + 1):
-        candidate_tokens = chunk_tokens[start_idx:start_idx + query_len]
-        candidate_str = " ".join(candidate_tokens)
-        candidate_clean = remove_punctuation(candidate_str)
-        score = fuzz.ratio(query_clean, candidate_clean)
-        if score > best_score:
-            best_score = score
-            best_substring = candidate_str
-    return best_substring, best_score
-
-def run_search_for_config(config, text, model, queries_to_run):
-    chunk_size, overlap = config
-    chunks = chunk_text_with_overlap(text, chunk_size, overlap)
-    index = create_faiss_index(chunks, model)
+def find_best_substring_in_chunks(query, chunks, chunk_indices):
+    """
+    Fuzzy-match `query` against every query-length token window of the chunks
+    `chunk_indices` of `chunks` (chunking.Chunks). Windows are token spans into
+    the document's shared token list, so nothing is re-split; every distinct
+    window is joined once and all of them are scored with a single rapidfuzz
+    cdist call.
+    Returns (position, best_substring, best_score, char_span), position indexing
+    `chunk_indices` and char_span being the substring's [start, end) character
+    offsets in the document text. Ties go to the first chunk and window;
+    position is None if no chunk is as long as the query.
+    """
+    query_clean = chunking.remove_punctuation(query)
+    query_len = len(query_clean.split())
+
+    window_starts, owners = [], []
+    for position, chunk_idx in enumerate(chunk_indices):
+        start, end = chunks.spans[chunk_idx].tolist()
+        n_windows = end - start - query_len + 1
+        if n_windows > 0:
+            window_starts.append(np.arange(start, start + n_windows))
+            owners.append(np.full(n_windows, position))
+
+    if not window_starts:
+        return None, None, -1, None
+    window_starts = np.concatenate(window_starts)
+    owners = np.concatenate(owners)
+    # Overlapping chunks share windows; each distinct one is scored once
+    unique_starts, window_rows = np.unique(window_starts, return_inverse=True)
+    clean_words = chunks.tokens.clean_words
+    clean_windows = [" ".join(clean_words[start:start + query_len]) for start in unique_starts.tolist()]
+    scores = process.cdist([query_clean], clean_windows, scorer=fuzz.ratio, dtype=np.float64, workers=FUZZY_WORKERS)[0]
+    scores = scores[window_rows]
+    best = int(np.argmax(scores))
+    best_start = int(window_starts[best])
+    best_end = best_start + query_len
+    char_span = chunks.tokens.char_span(best_start, best_end) if query_len else None
+    return int(owners[best]), chunks.tokens.join(best_start, best_end), float(scores[best]), char_span
+
+def run_search_for_config(config, chunks, chunk_embeddings, queries_to_run, query_embeddings):
     config_results = {}
-    for label, query in queries_to_run:
-        candidates = search_faiss(query, model, index, chunks, top_k=TOP_K)
-        best_fuzzy_score = -1
-        best_candidate = None
-        best_distance = None
-        best_chunk = None
-        for chunk_text, dist in candidates:
-            substring, score = find_best_substring_in_chunk(query, chunk_text)
-            if score > best_fuzzy_score:
-                best_fuzzy_score = score
-                best_candidate = substring
-                best_distance = dist
-                best_chunk = chunk_text
-        config_results[label] = (best_candidate, best_fuzzy_score, best_distance, best_chunk)
+    if not queries_to_run:
+        return config, config_results
+    all_candidates = search_chunks(query_embeddings, chunk_embeddings, top_k=TOP_K)
+    for (label, query), candidates in zip(queries_to_run, all_candidates):
+        with metrics.timed("fuzzy"):
+            position, best_candidate, best_fuzzy_score, char_span = find_best_substring_in_chunks(
+                query, chunks, [chunk_idx for chunk_idx, _ in candidates]
+            )
+        best_chunk, best_distance = None, None
+        if position is not None:
+            chunk_idx, best_distance = candidates[position]
+            # The excerpt is cut straight out of the document text by the chunk's character offsets
+            best_chunk = chunks.excerpt(chunk_idx)
+        config_results[label] = (best_candidate, best_fuzzy_score, best_distance, best_chunk, char_span)
     return config, config_results
 
-def update_progress_json(progress_dir, pbar, status=""):
-    progress_value = round(pbar.n / pbar.total, 4)
-    progress_path = os.path.join(progress_dir, "progress.json")
-
-    # Load current OCR progress to preserve it
-    ocr_data = {"progress": 1.0, "status": "Scanning færdig"}  # Default fallback
-    if os.path.exists(progress_path):
-        try:
-            with open(progress_path, "r", encoding="utf-8") as f:
-                existing = json.load(f)
-                ocr_data = existing.get("ocr", ocr_data)
-        except Exception as e:
-            print("⚠️ Failed to load existing OCR progress:", e)
-
-    with open(progress_path, "w", encoding="utf-8") as f:
-        json.dump({
-            "ocr": ocr_data,
-            "main": {
-                "progress": progress_value,
-                "status": status
-            }
-        }, f, ensure_ascii=False)
-
 def sanitize_matched_substring(text):
     """
     Remove commas and periods from the text.
@@ -137,175 +211,494 @@ def sanitize_matched_substring(text):
     sanitized = sanitized.replace("m?", "m2")
     return sanitized
 
-def main():
-    json_dir = "Files/Ground-truth"
-    text_dir = "Files/Policer"
-    output_dir = "Files/Output"
-    progressBar_dir = "Files/ProgressBar"
-
-    os.makedirs(progressBar_dir, exist_ok=True)
-    final_progress_path = os.path.join(progressBar_dir, "progress.json")
-    with open(final_progress_path, "w", encoding="utf-8") as f:
-        json.dump({
-            "ocr": {"progress": 1.0, "status": "Scanning færdig"},
-            "main": {"progress": 0.0, "status": "Starting..."}
-        }, f, ensure_ascii=False)
-
-    os.makedirs(output_dir, exist_ok=True)
-    json_files = glob.glob(os.path.join(json_dir, "*.json"))
-
-    for json_path in json_files:
-        filename = os.path.splitext(os.path.basename(json_path))[0]
-        text_path = os.path.join(text_dir, f"{filename}.txt")
-        output_path = os.path.join(output_dir, f"{filename}.json")
+def build_queries(street_name, house_number, postal_code, postal_district, area_size, numeric_area=None):
+    """
+    Returns (queries_to_run, group_mapping) for one document's ground-truth values.
+    With `numeric_area` (default NUMERIC_AREA) no area queries are built; the
+    area is matched by match_area instead.
+    """
+    if numeric_area is None:
+        numeric_area = NUMERIC_AREA
+    queries_to_run = []
+    group_mapping = {}
+    if street_name and house_number:
+        label = "street_name+house_number"
+        query = f"{street_name} {house_number}"
+        queries_to_run.append((label, query))
+        group_mapping[label] = label
+
+    if postal_code and postal_district:
+        label = "postal_code+postal_district"
+        query = f"{postal_code} {postal_district}"
+        queries_to_run.append((label, query))
+        group_mapping[label] = label
+
+    if area_size and not numeric_area:
+        area_size_str = str(area_size).strip()
+        for unit in ["m2", "m?", "kvm"]:
+            # When the unit follows the number
+            label_suffix = f"area_size_{unit}_suffix"
+            query_suffix = f"{area_size_str} {unit}"
+            queries_to_run.append((label_suffix, query_suffix))
+            group_mapping[label_suffix] = "area_size"
+
+            # When the unit precedes the number
+            label_prefix = f"area_size_{unit}_prefix"
+            query_prefix = f"{unit} {area_size_str}"
+            queries_to_run.append((label_prefix, query_prefix))
+            group_mapping[label_prefix] = "area_size"
+
+    return queries_to_run, group_mapping
+
+def run_configs(queries_to_run, query_embeddings, embedded, on_config_done=None):
+    """Search every config in parallel. Returns {config: {label: result}}."""
+    config_results = {}
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        # Run each config in a copy of this context so its stage timings are attributed to the current job
+        futures = {
+            executor.submit(contextvars.copy_context().run, run_search_for_config,
+                            config, *embedded[config], queries_to_run, query_embeddings): config
+            for config in embedded
+        }
+        for future in concurrent.futures.as_completed(futures):
+            config, results = future.result()
+            config_results[config] = results
+            if on_config_done:
+                on_config_done(config)
+    return config_results
+
+def run_cascade(queries_to_run, query_embeddings, group_mapping, embedded, configs=None,
+                threshold=None, embed_config=None, on_config_done=None):
+    """
+    Search the configs (default CONFIGS) one after another, cheapest first, and
+    drop a field group once any of its queries reaches `threshold` (default
+    CASCADE_THRESHOLD). `embedded` maps config to (chunks, embeddings); configs
+    missing from it are embedded with embed_config(config) only if the cascade
+    gets that far.
+    Returns {config: {label: result}} for the configs that were searched.
+    """
+    configs = CONFIGS if configs is None else configs
+    threshold = CASCADE_THRESHOLD if threshold is None else threshold
+    config_results = {}
+    resolved = set()
+    for config in configs:
+        rows = [i for i, (label, _) in enumerate(queries_to_run) if group_mapping[label] not in resolved]
+        if rows:
+            chunks, chunk_embeddings = embedded[config] if config in embedded else embed_config(config)
+            _, results = run_search_for_config(config, chunks, chunk_embeddings,
+                                               [queries_to_run[i] for i in rows], query_embeddings[rows])
+            config_results[config] = results
+            resolved.update(group_mapping[label] for label, (_, score, *_) in results.items() if score >= threshold)
+        metrics.increment("cascade_skipped_queries", len(queries_to_run) - len(rows))
+        if on_config_done:
+            on_config_done(config)
+    return config_results
+
+def match_literal(index, queries_to_run, group_mapping, threshold=None):
+    """
+    Search the literal field groups in a document's trigram index. Returns
+    (results, remaining): results are {label: result} like run_search_for_config's,
+    remaining are the queries whose group no lookup scored `threshold`
+    (default CASCADE_THRESHOLD) for.
+    """
+    threshold = CASCADE_THRESHOLD if threshold is None else threshold
+    results = {}
+    resolved = set()
+    for label, query in queries_to_run:
+        if group_mapping[label] not in LITERAL_GROUPS:
+            continue
+        candidate, score, excerpt, char_span = trigram_index.search(index, query)
+        if candidate is None:
+            continue
+        results[label] = (candidate, score, None, excerpt, char_span)
+        if score >= threshold:
+            resolved.add(group_mapping[label])
+    remaining = [(label, query) for label, query in queries_to_run if group_mapping[label] not in resolved]
+    metrics.increment("literal_resolved_queries", len(queries_to_run) - len(remaining))
+    return results, remaining
+
+def match_area(text, values, numeric_area=None):
+    """The numeric extractor's areaSize match for build_output, or None when areas are matched by the search."""
+    if numeric_area is None:
+        numeric_area = NUMERIC_AREA
+    return numeric.match_area(text, values[4]) if numeric_area else None
+
+def build_output(values, queries_to_run, group_mapping, config_results, area_match=None, words=None):
+    """
+    Pick the best match per field group across configs and build the output rows.
+    `config_results` may also hold the trigram index's results under LITERAL.
+    `area_match` is match_area's result, used for the area instead of the search.
+    Every row carries its pick's character span in the .txt ("char_span") and,
+    given the document's word table (`words`, see load_words), the pick's box on
+    the page ("location"), so it can be highlighted without running OCR again.
+    """
+    street_name, house_number, postal_code, postal_district, area_size = values
+    group_to_labels = {}
+    for label, group in group_mapping.items():
+        group_to_labels.setdefault(group, []).append(label)
+
+    addresses, postal_codes, area_sizes_results = [], [], []
+    group_index = 0
+
+    for group, labels in group_to_labels.items():
+        best_overall = None
+        best_config = None
+        best_query = None
+        for config, res in config_results.items():
+            for label in labels:
+                result = res.get(label)
+                if result is None:
+                    continue
+                if best_overall is None or result[1] > best_overall[1]:
+                    best_overall = result
+                    best_config = config
+                    best_query = next(q for lab, q in queries_to_run if lab == label)
+        if best_overall:
+            candidate, score, dist, chunk_text, char_span = best_overall
+            # Sanitize the best candidate before saving it
+            candidate = sanitize_matched_substring(candidate)
+            chunk_size, overlap = best_config if best_config != LITERAL else (None, None)
+            result_data = {
+                "group": group,
+                "query": best_query,
+                "chunk_size": chunk_size,
+                "overlap": overlap,
+                "resolved_by": f"{chunk_size}:{overlap}" if best_config != LITERAL else LITERAL,
+                "matched_substring": candidate,
+                "fuzzy_score": score,
+                "faiss_distance": dist,
+                "chunk_excerpt": chunk_text[:200],
+                "char_span": char_span
+            }
+            if group_index == 0:
+                addresses.append(result_data)
+            elif group_index == 1:
+                postal_codes.append(result_data)
+            elif group_index == 2:
+                area_sizes_results.append(result_data)
+        group_index += 1
+
+    if area_match:
+        candidate, score, dist, chunk_text, char_span = area_match
+        area_sizes_results.append({
+            "group": "area_size",
+            "query": str(area_size),
+            "chunk_size": None,
+            "overlap": None,
+            "resolved_by": "numeric",
+            "matched_substring": sanitize_matched_substring(candidate),
+            "fuzzy_score": score,
+            "faiss_distance": dist,
+            "chunk_excerpt": chunk_text[:200],
+            "char_span": char_span
+        })
+
+    def resolved_by(results):
+        """The config that produced the field's pick, as "chunk_size:overlap" (or "numeric")."""
+        return results[0]["resolved_by"] if results else ""
+
+    def located(results):
+        """The pick's char_span and, if the word table has boxes for it, its location on the page."""
+        char_span = results[0]["char_span"] if results else None
+        location = word_table.locate(words, *char_span) if words is not None and char_span else None
+        return {"char_span": list(char_span) if char_span else None, "location": location}
+
+    return [
+        {
+            "id": "Adresse:",
+            "expected": f"{street_name} {house_number}",
+            "received": addresses[0]["matched_substring"] if addresses else "",
+            "confidence": f'{addresses[0]["fuzzy_score"]}%' if addresses else "",
+            "resolved_by": resolved_by(addresses),
+            **located(addresses)
+        },
+        {
+            "id": "Areal:",
+            "expected": str(area_size),
+            "received": area_sizes_results[0]["matched_substring"] if area_sizes_results else "",
+            "confidence": f'{area_sizes_results[0]["fuzzy_score"]}%' if area_sizes_results else "",
+            "resolved_by": resolved_by(area_sizes_results),
+            **located(area_sizes_results)
+        },
+        {
+            "id": "By:",
+            "expected": f"{postal_district} {postal_code}",
+            "received": postal_codes[0]["matched_substring"] if postal_codes else "",
+            "confidence": f'{postal_codes[0]["fuzzy_score"]}%' if postal_codes else "",
+            "resolved_by": resolved_by(postal_codes),
+            **located(postal_codes)
+        }
+    ]
+
+def start_matching(values, text, index_path=None, literal=None, numeric_area=None, words=None):
+    """
+    Build a document's queries and resolve the fields its trigram index can
+    (with `literal`, default LITERAL_INDEX). `text` is the OCR text or its
+    chunking.Tokens; `index_path` is where the trigram index is cached (without
+    one it is built in memory). Returns the document's matching state for
+    finish_matching; its "search_queries" are left for the embedding search.
+    """
+    literal = LITERAL_INDEX if literal is None else literal
+    numeric_area = NUMERIC_AREA if numeric_area is None else numeric_area
+    tokens = chunking.tokenize(text)
+    queries_to_run, group_mapping = build_queries(*values, numeric_area=numeric_area)
+    config_results = {}
+    search_queries = queries_to_run
+    if literal:
+        index = trigram_index.load(index_path, tokens) if index_path else trigram_index.build(tokens)
+        config_results[LITERAL], search_queries = match_literal(index, queries_to_run, group_mapping)
+    return {
+        "values": values, "tokens": tokens, "queries_to_run": queries_to_run, "group_mapping": group_mapping,
+        "config_results": config_results, "search_queries": search_queries, "numeric_area": numeric_area,
+        "words": words,
+    }
+
+def finish_matching(doc, query_embeddings=None, embedded=None, cascade=None, configs=None, embed_config=None,
+                    on_config_done=None):
+    """
+    Search start_matching's remaining queries in the document's embedded chunks
+    and build the output rows. `query_embeddings` and `embedded` are the
+    document's embed_batch result (not needed when no queries are left). With
+    `cascade` (default CASCADE) the configs (default CONFIGS) are searched
+    cheapest first and configs missing from `embedded` are embedded by
+    embed_config(config); otherwise every config in `embedded` is searched.
+    """
+    cascade = CASCADE if cascade is None else cascade
+    config_results = dict(doc["config_results"])
+    if doc["search_queries"]:
+        if cascade:
+            config_results.update(run_cascade(doc["search_queries"], query_embeddings, doc["group_mapping"], embedded,
+                                              configs=configs, embed_config=embed_config, on_config_done=on_config_done))
+        else:
+            config_results.update(run_configs(doc["search_queries"], query_embeddings, embedded,
+                                              on_config_done=on_config_done))
+    return build_output(doc["values"], doc["queries_to_run"], doc["group_mapping"], config_results,
+                        match_area(doc["tokens"], doc["values"], doc["numeric_area"]), words=doc["words"])
+
+def load_values(ground_truth):
+    if isinstance(ground_truth, dict):
+        return parse_ground_truth(ground_truth)
+    return load_json(ground_truth)
+
+def load_words(text_path):
+    """
+    The document's word table (memory-mapped, see models/word_table.py), or
+    None for OCR text written before word tables were kept.
+    """
+    path = word_table.words_path(text_path)
+    return word_table.load(path) if os.path.exists(path) else None
 
-        with tqdm(total=8, desc=f"Processing {filename}", ncols=100, dynamic_ncols=True) as pbar:
-            def update_progress(status=""):
-                update_progress_json(progressBar_dir, pbar, status)
+def write_output(output_path, output_data):
+    with metrics.timed("write"):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as outfile:
+            json.dump(output_data, outfile, ensure_ascii=False, indent=4)
 
-            if os.path.exists(output_path):
-                pbar.write(f"Output already exists for '{filename}', skipping.")
-                pbar.update(8)
-                update_progress("Completed (skipped)")
-                continue
+def process_document(pdf_path, ground_truth, text_dir="Files/Policer", output_dir="Files/Output", job_id=None,
+                     ocr_engine=None):
+    """
+    Run OCR and matching for a single policy.
+    `ground_truth` is either the path to the ground-truth JSON or the already
+    parsed dict. Only this document's text, debug image and output JSON are
+    read or written, so the cost does not grow with the size of the corpus.
+    Progress is published on the in-memory progress bus under `job_id`
+    (defaults to the PDF's stem); stage timings are traced under `job_id` too,
+    unless the call runs inside a jobs.py job, which traces them under its own id.
+    `ocr_engine` overrides the deployment's OCR engine (OCR_ENGINE) for this document.
+    """
+    pdf_path = Path(pdf_path)
+    filename = pdf_path.stem
+    output_path = os.path.join(output_dir, f"{filename}.json")
+    job_id = job_id or filename
+
+    with metrics.job(job_id):
+        output_data = run_document_stages(pdf_path, ground_truth, text_dir, output_path, job_id, ocr_engine)
+    metrics.increment("documents_processed")
+    return output_data
+
+def run_document_stages(pdf_path, ground_truth, text_dir, output_path, job_id, ocr_engine=None):
+    """The OCR and matching steps of process_document, timed under metrics.job(job_id)."""
+    model = get_model()
+
+    text_path = tesseractocr.process_pdf(
+        pdf_path, Path(text_dir), engine=ocr_engine,
+        progress_callback=lambda value, status: progress.update(job_id, "ocr", value, status)
+    )
 
-            pbar.set_description("Step 1: Loading JSON")
-            street_name, house_number, postal_code, postal_district, area_size = load_json(json_path)
-            pbar.update(1)
-            update_progress("Loader Værdier")
+    progress.update(job_id, "ocr", 1.0, "Scanning færdig")
+    progress.update(job_id, "main", 0.0, "Starting...")
 
-            pbar.set_description("Step 2: Reading Text")
-            with open(text_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-            pbar.update(1)
-            update_progress("Læser Tekst")
-
-            pbar.set_description("Step 3: Building Search Queries")
-            queries_to_run = []
-            group_mapping = {}
-            if street_name and house_number:
-                label = "street_name+house_number"
-                query = f"{street_name} {house_number}"
-                queries_to_run.append((label, query))
-                group_mapping[label] = label
-
-            if postal_code and postal_district:
-                label = "postal_code+postal_district"
-                query = f"{postal_code} {postal_district}"
-                queries_to_run.append((label, query))
-                group_mapping[label] = label
-
-            if area_size:
-                area_size_str = str(area_size).strip()
-                for unit in ["m2", "m?", "kvm"]:
-                    # When the unit follows the number
-                    label_suffix = f"area_size_{unit}_suffix"
-                    query_suffix = f"{area_size_str} {unit}"
-                    queries_to_run.append((label_suffix, query_suffix))
-                    group_mapping[label_suffix] = "area_size"
-
-                    # When the unit precedes the number
-                    label_prefix = f"area_size_{unit}_prefix"
-                    query_prefix = f"{unit} {area_size_str}"
-                    queries_to_run.append((label_prefix, query_prefix))
-                    group_mapping[label_prefix] = "area_size"
+    with tqdm(total=8, desc=f"Processing {pdf_path.stem}", ncols=100, dynamic_ncols=True) as pbar:
+        def update_progress(status=""):
+            progress.update(job_id, "main", pbar.n / pbar.total, status)
 
+        pbar.set_description("Step 1: Loading JSON")
+        values = load_values(ground_truth)
+        pbar.update(1)
+        update_progress("Loader Værdier")
+
+        pbar.set_description("Step 2: Reading Text")
+        with open(text_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        pbar.update(1)
+        update_progress("Læser Tekst")
+
+        pbar.set_description("Step 3: Building Search Queries")
+        doc = start_matching(values, text, index_path=trigram_index.index_path(text_path), words=load_words(text_path))
+        pbar.update(1)
+        update_progress("Klargør søgning")
+
+        pbar.set_description("Step 4-6: Running search configs")
+        def config_done(config):
+            pbar.write(f"  → Finished config: chunk_size={config[0]}, overlap={config[1]}")
             pbar.update(1)
-            update_progress("Klargør søgning")
-
-            pbar.set_description("Step 4-6: Running FAISS configs")
-            config_results = {}
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                futures = {
-                    executor.submit(run_search_for_config, config, text, model, queries_to_run): config
-                    for config in CONFIGS
-                }
-                for future in concurrent.futures.as_completed(futures):
-                    config, results = future.result()
-                    config_results[config] = results
-                    pbar.write(f"  → Finished config: chunk_size={config[0]}, overlap={config[1]}")
-                    pbar.update(1)
-                    update_progress("Søger igennem Dokumentet")
-
-            pbar.set_description("Step 7: Saving data")
-            group_to_labels = {}
-            for label, group in group_mapping.items():
-                group_to_labels.setdefault(group, []).append(label)
-
-            addresses, postal_codes, area_sizes_results = [], [], []
-            group_index = 0
-
-            for group, labels in group_to_labels.items():
-                best_overall = None
-                best_config = None
-                best_query = None
-                for config, res in config_results.items():
-                    for label in labels:
-                        result = res.get(label)
-                        if result is None:
-                            continue
-                        candidate, score, dist, chunk_text = result
-                        if best_overall is None or score > best_overall[1]:
-                            best_overall = (candidate, score, dist, chunk_text)
-                            best_config = config
-                            best_query = next(q for lab, q in queries_to_run if lab == label)
-                if best_overall:
-                    candidate, score, dist, chunk_text = best_overall
-                    # Sanitize the best candidate before saving it
-                    candidate = sanitize_matched_substring(candidate)
-                    result_data = {
-                        "group": group,
-                        "query": best_query,
-                        "chunk_size": best_config[0],
-                        "overlap": best_config[1],
-                        "matched_substring": candidate,
-                        "fuzzy_score": score,
-                        "faiss_distance": dist,
-                        "chunk_excerpt": chunk_text[:200]
-                    }
-                    if group_index == 0:
-                        addresses.append(result_data)
-                    elif group_index == 1:
-                        postal_codes.append(result_data)
-                    elif group_index == 2:
-                        area_sizes_results.append(result_data)
-                group_index += 1
-
-            output_data = [
-                {
-                    "id": "Adresse:",
-                    "expected": f"{street_name} {house_number}",
-                    "received": addresses[0]["matched_substring"] if addresses else "",
-                    "confidence": f'{addresses[0]["fuzzy_score"]}%' if addresses else ""
-                },
-                {
-                    "id": "Areal:",
-                    "expected": str(area_size),
-                    "received": area_sizes_results[0]["matched_substring"] if area_sizes_results else "",
-                    "confidence": f'{area_sizes_results[0]["fuzzy_score"]}%' if area_sizes_results else ""
-                },
-                {
-                    "id": "By:",
-                    "expected": f"{postal_district} {postal_code}",
-                    "received": postal_codes[0]["matched_substring"] if postal_codes else "",
-                    "confidence": f'{postal_codes[0]["fuzzy_score"]}%' if postal_codes else ""
-                }
-            ]
-
-            with open(output_path, "w", encoding="utf-8") as outfile:
-                json.dump(output_data, outfile, ensure_ascii=False, indent=4)
-            pbar.update(1)
-            update_progress("Gennemført")
+            update_progress("Søger igennem Dokumentet")
+
+        # The document is tokenized once (in start_matching); the trigram index,
+        # every config's chunks and the area extractor all work on these tokens
+        tokens, search_queries = doc["tokens"], doc["search_queries"]
+        if not search_queries:
+            # Everything was found in the trigram index; the model is not needed
+            output_data = finish_matching(doc)
+            pbar.update(len(CONFIGS))
+        elif CASCADE:
+            # Embed the queries with the first config's chunks; later configs are
+            # only embedded if some field group is still unresolved when the cascade reaches them
+            query_embeddings, embedded = embed_batch([(tokens, search_queries)], model, configs=CONFIGS[:1])[0]
+            output_data = finish_matching(
+                doc, query_embeddings, embedded, cascade=True,
+                embed_config=lambda config: embed_batch([(tokens, [])], model, configs=[config])[0][1][config],
+                on_config_done=config_done
+            )
+        else:
+            # Encode every query and every config's chunks up front in one batched call,
+            # so the per-config threads only search and never touch the model
+            query_embeddings, embedded = embed_batch([(tokens, search_queries)], model)[0]
+            output_data = finish_matching(doc, query_embeddings, embedded, cascade=False, on_config_done=config_done)
+
+        pbar.set_description("Step 7: Saving data")
+        write_output(output_path, output_data)
+        pbar.update(1)
+        update_progress("Gennemført")
+
+        # ✅ Force final progress to 100% for main
+        progress.update(job_id, "main", 1.0, "Færdig")
+
+    return output_data
+
+def process_batch(documents, text_dir="Files/Policer", output_dir="Files/Output",
+                  ocr_workers=BATCH_OCR_WORKERS, batch_documents=BATCH_DOCUMENTS, ocr_engine=None, job_id="batch"):
+    """
+    Process many policies in one pipelined run. `documents` is a list of
+    (pdf_path, ground_truth) pairs, OCR'd with `ocr_engine` (default OCR_ENGINE).
+    OCR runs on `ocr_workers` threads while the main thread embeds finished
+    documents in groups of `batch_documents`, so chunk embedding happens in
+    large cross-document model batches. Returns one consolidated result set.
+    Stage timings are traced under `job_id` (or the calling jobs.py job's id).
+    """
+    with metrics.job(job_id):
+        return run_batch_stages(documents, text_dir, output_dir, ocr_workers, batch_documents, ocr_engine)
+
+def run_batch_stages(documents, text_dir, output_dir, ocr_workers, batch_documents, ocr_engine=None):
+    """The body of process_batch, timed under metrics.job(job_id)."""
+    model = get_model()
+    start_time = time.time()
+    results = {}
+    errors = {}
+    ready = []
+
+    def prepare(pdf_path, ground_truth):
+        pdf_path = Path(pdf_path)
+        text_path = tesseractocr.process_pdf(pdf_path, Path(text_dir), engine=ocr_engine)
+        values = load_values(ground_truth)
+        with open(text_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        doc = start_matching(values, text, index_path=trigram_index.index_path(text_path), words=load_words(text_path))
+        doc["stem"] = pdf_path.stem
+        return doc
+
+    def flush():
+        if not ready:
+            return
+        # Only documents with fields the trigram index couldn't resolve are embedded
+        to_embed = [doc for doc in ready if doc["search_queries"]]
+        embedded_documents = embed_batch([(doc["tokens"], doc["search_queries"]) for doc in to_embed], model) if to_embed else []
+        for doc, (query_embeddings, embedded) in zip(to_embed, embedded_documents):
+            doc["embedded"] = (query_embeddings, embedded)
+        for doc in ready:
+            stem = doc["stem"]
+            try:
+                output_data = finish_matching(doc, *doc.get("embedded", (None, None)))
+                write_output(os.path.join(output_dir, f"{stem}.json"), output_data)
+                results[stem] = output_data
+            except Exception as e:
+                errors[stem] = str(e)
+        ready.clear()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=ocr_workers) as executor:
+        futures = {
+            # Each OCR thread runs in a copy of this context so its stage timings land in the batch's trace
+            executor.submit(contextvars.copy_context().run, prepare, pdf_path, ground_truth): Path(pdf_path).stem
+            for pdf_path, ground_truth in documents
+        }
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Batch", ncols=100):
+            try:
+                ready.append(future.result())
+            except Exception as e:
+                errors[futures[future]] = str(e)
+            if len(ready) >= batch_documents:
+                flush()
+        flush()
+
+    metrics.increment("documents_processed", len(results))
+    elapsed = time.time() - start_time
+    documents_per_minute = len(results) / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"Processed {len(results)} documents in {elapsed:.1f}s ({documents_per_minute:.1f} documents/minute)")
+    return {
+        "documents_per_minute": round(documents_per_minute, 2),
+        "total_documents": len(documents),
+        "processed": len(results),
+        "failed": len(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "results": results,
+        "errors": errors,
+    }
+
+def resolve_documents(filenames=None, pdf_dir="Files/policer-Raw", json_dir="Files/Ground-truth"):
+    """Map PDF filenames (or every ground-truth JSON when none are given) to (pdf_path, ground_truth_path) pairs."""
+    if filenames:
+        stems = [os.path.splitext(os.path.basename(filename))[0] for filename in filenames]
+    else:
+        stems = [os.path.splitext(os.path.basename(p))[0] for p in glob.glob(os.path.join(json_dir, "*.json"))]
+    return [(os.path.join(pdf_dir, f"{stem}.pdf"), os.path.join(json_dir, f"{stem}.json")) for stem in stems]
+
+def main(filename=None):
+    output_dir = "Files/Output"
+
+    for pdf_path, json_path in resolve_documents([filename] if filename else None):
+        filename = Path(pdf_path).stem
+        output_path = os.path.join(output_dir, f"{filename}.json")
+        if os.path.exists(output_path):
+            print(f"Output already exists for '{filename}', skipping.")
+            continue
+        process_document(pdf_path, json_path, output_dir=output_dir)
 
-            # ✅ Force final progress to 100% for main
-            with open(os.path.join(progressBar_dir, "progress.json"), "r", encoding="utf-8") as f:
-                final_data = json.load(f)
-            final_data["main"] = {"progress": 1.0, "status": "Færdig"}
-            with open(os.path.join(progressBar_dir, "progress.json"), "w", encoding="utf-8") as f:
-                json.dump(final_data, f, ensure_ascii=False)
+def run_pipeline(filename=None):
+    """Run OCR and matching as a plain function call, reusing the loaded model."""
+    main(filename)
 
 if __name__ == "__main__":
-    model_name = "sentence-transformers/xlm-r-100langs-bert-base-nli-stsb-mean-tokens"
-    model = SentenceTransformer(model_name)
-    tesseractocr.process_all_pdfs()
-    main()
+    parser = argparse.ArgumentParser(description="Extract and verify policy fields.")
+    parser.add_argument("filenames", nargs="*", help="PDF file names in Files/policer-Raw (default: every ground-truth document)")
+    parser.add_argument("--batch", action="store_true", help="process the documents as one pipelined batch")
+    parser.add_argument("--report", help="with --batch, write the consolidated result set to this JSON file")
+    args = parser.parse_args()
+
+    if args.batch:
+        report = process_batch(resolve_documents(args.filenames))
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=4)
+    else:
+        for name in args.filenames or [None]:
+            main(name)
@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import contextvars
+import json
+import os
+import threading
+import time
+
+# Stage timings and event counters for the pipeline. Every timed stage is
+# passed to the registered hooks; the built-in hook keeps Prometheus-style
+# histograms and a per-job trace.
+#
+# Stages: rasterize, preprocess, blank, ocr_page, text_layer, trigram_index, chunk,
+# embed, index, search, trigram_search, fuzzy, numeric, write
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_TRACES = 200
+# Set to write each job's trace to <dir>/<job_id>.json when the job finishes
+TRACE_DIR = os.environ.get("PIPELINE_TRACE_DIR")
+
+current_job = contextvars.ContextVar("current_job", default=None)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_traces = OrderedDict()
+_hooks = []
+
+def add_hook(hook):
+    """Register hook(stage, seconds, job_id), called after every timed stage."""
+    _hooks.append(hook)
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+def _record(stage, seconds, job_id):
+    with _lock:
+        histogram = _histograms.setdefault(stage, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+        if job_id is not None:
+            trace = _traces.setdefault(job_id, [])
+            trace.append({"stage": stage, "ended_at": round(time.time(), 6), "seconds": round(seconds, 6)})
+            _traces.move_to_end(job_id)
+            while len(_traces) > MAX_TRACES:
+                _traces.popitem(last=False)
+
+add_hook(_record)
+
+def observe(stage, seconds, job_id=None):
+    job_id = job_id if job_id is not None else current_job.get()
+    for hook in list(_hooks):
+        hook(stage, seconds, job_id)
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+def increment(event, amount=1):
+    with _lock:
+        _counters[event] = _counters.get(event, 0) + amount
+
+@contextmanager
+def job(job_id):
+    """
+    Attribute every stage timed inside the block (in this context) to `job_id`,
+    starting a fresh trace for it. Inside another job() block the outer job
+    keeps the trace, so a queued job's stages stay under its jobs.py id.
+    """
+    if current_job.get() is not None:
+        yield
+        return
+    with _lock:
+        _traces.pop(job_id, None)
+    token = current_job.set(job_id)
+    try:
+        yield
+    finally:
+        current_job.reset(token)
+        if TRACE_DIR:
+            dump_trace(job_id, os.path.join(TRACE_DIR, f"{job_id}.json"))
+
+def trace(job_id):
+    with _lock:
+        return list(_traces.get(job_id, []))
+
+def dump_trace(job_id, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"job_id": job_id, "stages": trace(job_id)}, f, ensure_ascii=False, indent=4)
+
+def render_prometheus(gauges=None):
+    """All histograms, counters and the given {name: value} gauges in Prometheus text format."""
+    lines = [
+        "# HELP pipeline_stage_seconds Time spent in each pipeline stage.",
+        "# TYPE pipeline_stage_seconds histogram",
+    ]
+    with _lock:
+        for stage, histogram in sorted(_histograms.items()):
+            for bound, count in zip(BUCKETS, histogram["buckets"]):
+                lines.append(f'pipeline_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'pipeline_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'pipeline_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+            lines.append(f'pipeline_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+        lines.append("# HELP pipeline_events_total Pipeline events.")
+        lines.append("# TYPE pipeline_events_total counter")
+        for event, count in sorted(_counters.items()):
+            lines.append(f'pipeline_events_total{{event="{event}"}} {count}')
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
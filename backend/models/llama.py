@@ -1,8 +1,5 @@
 from pathlib import Path
-import requests
 import os
-import psutil
-import GPUtil
 import threading
 import time
 import json
@@ -22,23 +19,6 @@ def load_ground_truth(json_path):
         print(f"Error decoding JSON from the file: {json_path}")
         exit()
 
-# Define the directory containing the text file and the JSON file
-txt_dir = Path("Files\Policer") # Path to the folder containing the text file
-json_file_path = Path("Files\Ground truth\Ornevej-45.json")  # Path to your JSON file
-
-# Get the list of .txt files in the directory
-txt_files = [f for f in os.listdir(txt_dir) if f.endswith(".txt")]
-
-# Ensure there is exactly one text file to compare
-if len(txt_files) != 1:
-    print("Error: There should be exactly one TXT file for comparison.")
-    exit()
-
-# Check if the JSON file exists
-if not os.path.exists(json_file_path):
-    print(f"Error: The JSON file does not exist at the specified path: {json_file_path}")
-    exit()
-
 def remove_href(data):
     """ Recursively remove all 'href' keys from JSON data. """
     if isinstance(data, dict):
@@ -55,39 +35,11 @@ def load_ground_truth(json_file_path):
 
     return remove_href(data)
 
-# Example usage
-ground_truth = load_ground_truth(json_file_path)
-
-# Read the contents of the text file
-txt_file_path = os.path.join(txt_dir, txt_files[0])
-with open(txt_file_path, 'r', encoding='utf-8') as f:
-    txt_content = f.read()
-
-# Create the prompt for comparison
-prompt = (
-    f"Your job is to clarify if the Text file content differs from the ground truth data. **DO NOT EXPLAIN THE INSURANCE IM BEGGING YOU**\n\n"
-    f"Ground Truth:\n{json.dumps(ground_truth, indent=2)}\n\n"
-    f"Text File Content:\n{txt_content}\n\n"
-    f"Keep your answer very precise, you should only consider the following variables **()** anything else doesnt matter"
-    f"The Text File may not explicitly label the variables, but their values may still be present.\n"
-)
-
-url = "http://localhost:11434/api/generate"
-data = {
-    "model": "llama3.2",
-    "prompt": prompt,
-    "stream": False,
-    "options": {
-        "temperature": 0.7,
-        "num_predict": 1000,
-        "top_p": 0.9,
-        "top_k": 32,
-        "repeat_penalty": 1.1,
-    }
-}
-
 # Function to monitor resource usage in real-time
 def monitor_resources(stop_event):
+    import psutil
+    import GPUtil
+
     while not stop_event.is_set():
         cpu_usage = psutil.cpu_percent()
         ram_usage = psutil.virtual_memory().used / (1024 ** 3)  # Convert bytes to GB
@@ -97,32 +49,85 @@ def monitor_resources(stop_event):
         print(f"\n[Resource Monitor] CPU: {cpu_usage:.2f}% | RAM: {ram_usage:.2f} GB | VRAM: {vram_usage:.2f} MB", end="\r")
         time.sleep(1)
 
-# Start resource monitoring in a separate thread
-stop_event = threading.Event()
-monitor_thread = threading.Thread(target=monitor_resources, args=(stop_event,))
-monitor_thread.start()
+def main():
+    import requests
 
-# Send request to the model
-response = requests.post(url, json=data)
+    # Define the directory containing the text file and the JSON file
+    txt_dir = Path("Files\Policer") # Path to the folder containing the text file
+    json_file_path = Path("Files\Ground truth\Ornevej-45.json")  # Path to your JSON file
 
-# Stop resource monitoring
-time.sleep(1)  # Allow final capture before stopping
-stop_event.set()
-monitor_thread.join()
+    # Get the list of .txt files in the directory
+    txt_files = [f for f in os.listdir(txt_dir) if f.endswith(".txt")]
 
-if response.status_code == 200:
-    try:
-        result = response.json()
-        print("\nResponse:")
-        print(result.get("response", ""))  # Extract only the generated text
-        print("\nPerformance Metrics:")
-        print(f"Total Duration: {result.get('total_duration', 0) / 1e9:.3f} s")
-        print(f"Load Duration: {result.get('load_duration', 0) / 1e9:.6f} s")
-        print(f"Prompt Eval Count: {result.get('prompt_eval_count', 'N/A')}")
-        print(f"Prompt Eval Duration: {result.get('prompt_eval_duration', 0) / 1e9:.6f} s")
-        print(f"Eval Count: {result.get('eval_count', 'N/A')}")
-        print(f"Eval Duration: {result.get('eval_duration', 0) / 1e9:.3f} s")
-    except ValueError:
-        print("Error decoding JSON response")
-else:
-    print(f"Error: {response.status_code}, {response.text}")
+    # Ensure there is exactly one text file to compare
+    if len(txt_files) != 1:
+        print("Error: There should be exactly one TXT file for comparison.")
+        exit()
+
+    # Check if the JSON file exists
+    if not os.path.exists(json_file_path):
+        print(f"Error: The JSON file does not exist at the specified path: {json_file_path}")
+        exit()
+
+    ground_truth = load_ground_truth(json_file_path)
+
+    # Read the contents of the text file
+    txt_file_path = os.path.join(txt_dir, txt_files[0])
+    with open(txt_file_path, 'r', encoding='utf-8') as f:
+        txt_content = f.read()
+
+    # Create the prompt for comparison
+    prompt = (
+        f"Your job is to clarify if the Text file content differs from the ground truth data. **DO NOT EXPLAIN THE INSURANCE IM BEGGING YOU**\n\n"
+        f"Ground Truth:\n{json.dumps(ground_truth, indent=2)}\n\n"
+        f"Text File Content:\n{txt_content}\n\n"
+        f"Keep your answer very precise, you should only consider the following variables **()** anything else doesnt matter"
+        f"The Text File may not explicitly label the variables, but their values may still be present.\n"
+    )
+
+    url = "http://localhost:11434/api/generate"
+    data = {
+        "model": "llama3.2",
+        "prompt": prompt,
+        "stream": False,
+        "options": {
+            "temperature": 0.7,
+            "num_predict": 1000,
+            "top_p": 0.9,
+            "top_k": 32,
+            "repeat_penalty": 1.1,
+        }
+    }
+
+    # Start resource monitoring in a separate thread
+    stop_event = threading.Event()
+    monitor_thread = threading.Thread(target=monitor_resources, args=(stop_event,))
+    monitor_thread.start()
+
+    # Send request to the model
+    response = requests.post(url, json=data)
+
+    # Stop resource monitoring
+    time.sleep(1)  # Allow final capture before stopping
+    stop_event.set()
+    monitor_thread.join()
+
+    if response.status_code == 200:
+        try:
+            result = response.json()
+            print("\nResponse:")
+            print(result.get("response", ""))  # Extract only the generated text
+            print("\nPerformance Metrics:")
+            print(f"Total Duration: {result.get('total_duration', 0) / 1e9:.3f} s")
+            print(f"Load Duration: {result.get('load_duration', 0) / 1e9:.6f} s")
+            print(f"Prompt Eval Count: {result.get('prompt_eval_count', 'N/A')}")
+            print(f"Prompt Eval Duration: {result.get('prompt_eval_duration', 0) / 1e9:.6f} s")
+            print(f"Eval Count: {result.get('eval_count', 'N/A')}")
+            print(f"Eval Duration: {result.get('eval_duration', 0) / 1e9:.3f} s")
+        except ValueError:
+            print("Error decoding JSON response")
+    else:
+        print(f"Error: {response.status_code}, {response.text}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+# Point OCR_CACHE_DIR at a shared volume to reuse OCR results across machines
+CACHE_DIR = Path(os.environ.get("OCR_CACHE_DIR", "Files/Cache/ocr"))
+CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+_evict_lock = threading.Lock()
+
+def file_sha256(path, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_key(pdf_path, params):
+    """
+    Key an OCR result by the PDF's content and every parameter that changes the output.
+    Renamed or duplicate PDFs share an entry; a replaced PDF or a new lang/crop setting does not.
+    """
+    digest = hashlib.sha256()
+    digest.update(file_sha256(pdf_path).encode("ascii"))
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def restore(key, artifacts, cache_dir=CACHE_DIR):
+    """
+    Copy a cached entry's files to their destinations. `artifacts` maps artifact
+    name -> destination path. Destinations of artifacts the entry does not hold
+    are deleted, so files left by an earlier PDF with the same stem are not
+    mixed with this one's. Returns False on a miss, including an entry that
+    another worker evicts while it is being copied.
+    """
+    entry_dir = Path(cache_dir) / key
+    try:
+        with open(entry_dir / "manifest.json", "r", encoding="utf-8") as f:
+            stored = json.load(f)
+        for name, destination in artifacts.items():
+            if name not in stored:
+                Path(destination).unlink(missing_ok=True)
+        for name, destination in artifacts.items():
+            if name in stored:
+                Path(destination).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(entry_dir / name, destination)
+        # Mark as recently used for LRU eviction
+        os.utime(entry_dir)
+    except (OSError, ValueError):
+        return False
+    return True
+
+def store(key, artifacts, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Store the existing files in `artifacts` (name -> source path) under `key`, then evict if over the size limit."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Build the entry in a temporary directory and rename it into place, so
+    # concurrent readers never see a half-written entry
+    tmp_dir = cache_dir / f".tmp-{uuid.uuid4().hex}"
+    tmp_dir.mkdir()
+    stored = []
+    for name, source in artifacts.items():
+        if Path(source).exists():
+            shutil.copyfile(source, tmp_dir / name)
+            stored.append(name)
+    with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(stored, f)
+    try:
+        os.replace(tmp_dir, cache_dir / key)
+    except OSError:
+        # Another worker stored the same key first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    evict(cache_dir, max_bytes)
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Delete least recently used entries until the cache fits in `max_bytes`.
+    The lock only covers this process; entries that other workers sharing
+    OCR_CACHE_DIR delete in the meantime are skipped.
+    """
+    with _evict_lock:
+        entries = []
+        total = 0
+        for entry_dir in Path(cache_dir).iterdir():
+            if not entry_dir.is_dir() or entry_dir.name.startswith(".tmp-"):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in entry_dir.iterdir())
+                entries.append((entry_dir.stat().st_mtime, size, entry_dir))
+            except OSError:
+                continue
+            total += size
+        entries.sort()
+        for _, size, entry_dir in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            print(f"🗑️ Evicted OCR cache entry {entry_dir.name} ({size / 1024:.0f} KB)")
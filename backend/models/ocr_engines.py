@@ -0,0 +1,197 @@
+# OCR engines behind one interface, so pdf_to_text (rasterization, text layer,
+# page-1 blanking, cache) works the same whichever engine reads the pages.
+# An engine provides:
+#   image_to_data(image, lang)  word table DataFrame with text, conf, left, top,
+#                               width and height columns (conf -1 = no word)
+#   ocr_pages(images, lang, include_confidence)
+#                               [(page_text, avg_confidence, words), ...] for a batch of
+#                               pages; words is page_words' table, or None without boxes
+#   batch_pages                 how many pages pdf_to_text hands over per ocr_pages call
+#   cache_params()              everything about the engine that changes its output
+# Engines are small picklable objects; the loaded models live in per-thread
+# caches in this module, so every pool worker initialises its own once and
+# keeps it for the life of the process.
+import os
+import threading
+import numpy as np
+import metrics
+
+# Deployment default; process_pdf/process_document take a per-document override
+OCR_ENGINE = os.environ.get("OCR_ENGINE", "tesseract")
+# Tesseract binding: "tesserocr" keeps an initialised engine per thread (so per
+# pool worker) and hands it images in memory; "pytesseract" writes every image to
+# a temp file and starts a tesseract process that reloads the traineddata.
+# "auto" uses tesserocr when it is installed (pip install tesserocr, see the
+# README) and says once which binding it picked.
+TESSERACT_API = os.environ.get("TESSERACT_API", "auto")
+# Pages per EasyOCR readtext_batched call
+EASYOCR_BATCH_PAGES = int(os.environ.get("EASYOCR_BATCH_PAGES", "4"))
+WORD_COLUMNS = ["left", "top", "width", "height", "conf", "text"]
+
+_local = threading.local()
+_auto_api = None
+
+def _thread_cache():
+    cache = getattr(_local, "cache", None)
+    if cache is None:
+        cache = _local.cache = {}
+    return cache
+
+def page_words(ocr_data):
+    """The rows of a word table that make up the page text, in reading order."""
+    words = ocr_data[(ocr_data.conf != -1) & ocr_data.text.notna()]
+    return words[WORD_COLUMNS]
+
+def page_text_from_data(ocr_data):
+    """Turn a word table into (page_text, avg_confidence)."""
+    valid_data = ocr_data[ocr_data.conf != -1]
+
+    avg_confidence = np.mean(valid_data.conf) if not valid_data.empty else 0
+    return " ".join(valid_data.text.dropna()), avg_confidence
+
+def page_result(ocr_data, include_confidence=True):
+    """(page_text, avg_confidence, words) for ocr_pages."""
+    page_text, avg_confidence = page_text_from_data(ocr_data)
+    return page_text, avg_confidence if include_confidence else None, page_words(ocr_data)
+
+class TesseractEngine:
+    name = "tesseract"
+    batch_pages = 1
+
+    def __init__(self, api=None):
+        self.api = resolve_tesseract_api(api)
+
+    def cache_params(self):
+        return {"engine": self.name, "tesseract_api": self.api}
+
+    def _engine(self, lang):
+        """This thread's tesserocr engine for `lang`, initialised (traineddata loaded) on first use."""
+        import tesserocr
+
+        cache = _thread_cache()
+        key = ("tesserocr", lang)
+        if key not in cache:
+            cache[key] = tesserocr.PyTessBaseAPI(lang=lang)
+            metrics.increment("tesseract_engine_init")
+        return cache[key]
+
+    def image_to_data(self, image, lang="dan"):
+        if self.api == "pytesseract":
+            import pytesseract
+
+            return pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DATAFRAME)
+
+        import pandas as pd
+        from tesserocr import RIL, iterate_level
+
+        engine = self._engine(lang)
+        engine.SetImage(image)
+        engine.Recognize()
+        rows = []
+        for word in iterate_level(engine.GetIterator(), RIL.WORD):
+            text = word.GetUTF8Text(RIL.WORD)
+            box = word.BoundingBox(RIL.WORD)
+            if not text or box is None:
+                continue
+            left, top, right, bottom = box
+            rows.append((left, top, right - left, bottom - top, word.Confidence(RIL.WORD), text))
+        engine.Clear()
+        return pd.DataFrame(rows, columns=WORD_COLUMNS)
+
+    def image_to_string(self, image, lang="dan"):
+        if self.api == "pytesseract":
+            import pytesseract
+
+            return pytesseract.image_to_string(image, lang=lang)
+        engine = self._engine(lang)
+        engine.SetImage(image)
+        text = engine.GetUTF8Text()
+        engine.Clear()
+        return text
+
+    def ocr_pages(self, images, lang="dan", include_confidence=True):
+        if include_confidence:
+            return [page_result(self.image_to_data(image, lang)) for image in images]
+        return [(self.image_to_string(image, lang), None, None) for image in images]
+
+class EasyOCREngine:
+    name = "easyocr"
+
+    def __init__(self, gpu=False, batch_pages=EASYOCR_BATCH_PAGES):
+        self.gpu = gpu
+        self.batch_pages = batch_pages
+
+    def cache_params(self):
+        return {"engine": self.name}
+
+    def _reader(self, lang):
+        """This thread's EasyOCR Reader, created (detector and recognizer loaded) on first use."""
+        # torch and EasyOCR can load two OpenMP runtimes (notably on Windows)
+        os.environ.setdefault("KMP_DUPLICATE_LIB_OK", "TRUE")
+        import easyocr
+
+        # EasyOCR uses "da" for Danish
+        lang_code = "da" if lang.lower() in ["dan", "danish"] else lang
+        cache = _thread_cache()
+        key = ("easyocr", lang_code, self.gpu)
+        if key not in cache:
+            cache[key] = easyocr.Reader([lang_code], gpu=self.gpu, verbose=False)
+            metrics.increment("easyocr_reader_init")
+        return cache[key]
+
+    @staticmethod
+    def _word_table(results):
+        import pandas as pd
+
+        rows = []
+        for box, text, conf in results:
+            xs = [point[0] for point in box]
+            ys = [point[1] for point in box]
+            rows.append((int(min(xs)), int(min(ys)), int(max(xs) - min(xs)), int(max(ys) - min(ys)), conf * 100, text))
+        return pd.DataFrame(rows, columns=WORD_COLUMNS)
+
+    def image_to_data(self, image, lang="dan"):
+        # EasyOCR reports text boxes (usually a phrase), not single words
+        return self._word_table(self._reader(lang).readtext(np.array(image), detail=1))
+
+    def ocr_pages(self, images, lang="dan", include_confidence=True):
+        reader = self._reader(lang)
+        arrays = [np.array(image) for image in images]
+        if len({array.shape for array in arrays}) == 1:
+            batches = reader.readtext_batched(arrays, detail=1, batch_size=len(arrays))
+        else:
+            # readtext_batched needs equally sized images
+            batches = [reader.readtext(array, detail=1) for array in arrays]
+        return [page_result(self._word_table(results), include_confidence) for results in batches]
+
+ENGINES = {
+    "tesseract": TesseractEngine,
+    "easyocr": EasyOCREngine,
+}
+
+def resolve_tesseract_api(api=None):
+    global _auto_api
+    api = api or TESSERACT_API
+    if api == "auto":
+        if _auto_api is None:
+            try:
+                import tesserocr  # noqa: F401
+                _auto_api = "tesserocr"
+                print("Tesseract binding: tesserocr (engines are kept loaded per worker)")
+            except ImportError:
+                _auto_api = "pytesseract"
+                print("Tesseract binding: pytesseract (one tesseract process per page; "
+                      "pip install tesserocr to keep engines loaded)")
+        return _auto_api
+    if api not in ("tesserocr", "pytesseract"):
+        raise ValueError(f"Unknown Tesseract API: {api}")
+    return api
+
+def get_engine(engine=None):
+    """An engine instance for `engine`: an instance (returned as is), an engine name, or None for OCR_ENGINE."""
+    if engine is not None and not isinstance(engine, str):
+        return engine
+    name = engine or OCR_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Unknown OCR engine: {name} (expected one of {', '.join(ENGINES)})")
+    return ENGINES[name]()
@@ -0,0 +1,141 @@
+# Image preprocessing between rasterization and OCR. Steps are chosen with a
+# comma-separated spec (OCR_PREPROCESS or the `preprocess` argument of
+# process_pdf) and run in the given order:
+#   grayscale        luminance only (most OCR time is spent on fewer channels)
+#   binarize         Otsu threshold to pure black/white
+#   deskew           straighten pages scanned at a slight angle (up to DESKEW_MAX_DEGREES)
+#   downscale=<dpi>  resample to <dpi> if the page was rasterized at a higher DPI
+# e.g. OCR_PREPROCESS="grayscale,deskew,binarize". Empty or "none" leaves pages as rendered.
+# OpenCV (opencv-python-headless) is needed for deskew and downscale and is only
+# imported when one of them is used.
+import os
+import numpy as np
+
+OCR_PREPROCESS = os.environ.get("OCR_PREPROCESS", "")
+STEPS = ("grayscale", "binarize", "deskew", "downscale")
+DESKEW_MAX_DEGREES = 5.0
+DESKEW_STEP_DEGREES = 0.1
+# Dark pixels sampled to estimate the skew angle
+DESKEW_SAMPLE_POINTS = 20000
+
+def parse_steps(spec=None):
+    """
+    Turn a spec ("grayscale,downscale=150", a list of such steps, or None for
+    OCR_PREPROCESS) into a list of (step, argument) pairs.
+    """
+    if spec is None:
+        spec = OCR_PREPROCESS
+    if isinstance(spec, str):
+        spec = spec.split(",")
+    steps = []
+    for part in spec:
+        part = part.strip()
+        if not part or part == "none":
+            continue
+        name, _, argument = part.partition("=")
+        if name not in STEPS:
+            raise ValueError(f"Unknown preprocessing step: {name} (expected one of {', '.join(STEPS)})")
+        if name == "downscale":
+            if not argument:
+                raise ValueError("downscale needs a target DPI, e.g. downscale=150")
+            argument = int(argument)
+        steps.append((name, argument or None))
+    return steps
+
+def describe(steps):
+    """Canonical spec string for `steps`, used in the OCR cache key and benchmark reports."""
+    return ",".join(name if argument is None else f"{name}={argument}" for name, argument in steps) or "none"
+
+def to_grayscale(array):
+    if array.ndim == 2:
+        return array
+    # ITU-R 601 luma, the same weights as PIL's convert("L")
+    gray = array[..., 0] * 0.299 + array[..., 1] * 0.587 + array[..., 2] * 0.114
+    return gray.round().astype(np.uint8)
+
+def is_uniform(gray):
+    """True for a single-colour page (e.g. a blank back page), which has no ink to separate."""
+    return gray.size == 0 or gray.min() == gray.max()
+
+def otsu_threshold(gray):
+    """
+    The threshold that best separates ink from paper (maximum between-class
+    variance). A uniform page has no such threshold; it gets 127, so a blank
+    page binarizes to plain white (or black).
+    """
+    if is_uniform(gray):
+        return 127
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weights = np.cumsum(hist)
+    means = np.cumsum(hist * np.arange(256))
+    total, total_mean = weights[-1], means[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (total_mean * weights / total - means) ** 2 / (weights * (total - weights))
+    return int(np.nanargmax(variance))
+
+def binarize(array):
+    gray = to_grayscale(array)
+    return np.where(gray > otsu_threshold(gray), 255, 0).astype(np.uint8)
+
+def skew_angle(gray):
+    """
+    The counter-clockwise rotation (degrees) that straightens the page, found
+    with a projection profile: the angle at which the dark pixels pile up into
+    the sharpest text lines. All candidate angles are scored in one vectorized
+    pass over a sample of the dark pixels.
+    """
+    if is_uniform(gray):
+        return 0.0
+    ys, xs = np.nonzero(gray <= otsu_threshold(gray))
+    if len(ys) < 100:
+        return 0.0
+    stride = max(1, len(ys) // DESKEW_SAMPLE_POINTS)
+    ys, xs = ys[::stride].astype(np.float32), xs[::stride].astype(np.float32)
+
+    angles = np.deg2rad(np.arange(-DESKEW_MAX_DEGREES, DESKEW_MAX_DEGREES + DESKEW_STEP_DEGREES / 2, DESKEW_STEP_DEGREES))
+    # Row each pixel lands on after undoing a skew of `angle`, for every angle at once
+    rows = ys[None, :] * np.cos(angles)[:, None] - xs[None, :] * np.sin(angles)[:, None]
+    rows = np.floor(rows - rows.min()).astype(np.int64)
+    n_rows = int(rows.max()) + 1
+    counts = np.bincount((rows + np.arange(len(angles))[:, None] * n_rows).ravel(), minlength=len(angles) * n_rows)
+    sharpness = (counts.reshape(len(angles), n_rows).astype(np.float64) ** 2).sum(axis=1)
+    return float(np.rad2deg(angles[int(np.argmax(sharpness))]))
+
+def deskew(array):
+    import cv2
+
+    angle = skew_angle(to_grayscale(array))
+    if abs(angle) < DESKEW_STEP_DEGREES / 2:
+        return array
+    height, width = array.shape[:2]
+    rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    fill = 255 if array.ndim == 2 else (255,) * array.shape[2]
+    return cv2.warpAffine(array, rotation, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=fill)
+
+def downscale(array, target_dpi, dpi):
+    import cv2
+
+    if not dpi or target_dpi >= dpi:
+        return array
+    scale = target_dpi / dpi
+    height, width = array.shape[:2]
+    return cv2.resize(array, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+def preprocess(image, steps, dpi=None):
+    """Run `steps` (from parse_steps) on a PIL page image rendered at `dpi`; returns a PIL image."""
+    if not steps:
+        return image
+    from PIL import Image
+
+    array = np.asarray(image)
+    for name, argument in steps:
+        if name == "grayscale":
+            array = to_grayscale(array)
+        elif name == "binarize":
+            array = binarize(array)
+        elif name == "deskew":
+            array = deskew(array)
+        elif name == "downscale":
+            array = downscale(array, argument, dpi)
+    return Image.fromarray(np.ascontiguousarray(array))
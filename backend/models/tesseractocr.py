@@ -1,24 +1,68 @@
-﻿from pdf2image import convert_from_path
+﻿# PDF -> text for any OCR engine in models/ocr_engines.py (Tesseract by default).
+# Heavy OCR dependencies (pdf2image, the engines, PIL, pandas) are imported
+# inside the functions that use them, so importing this module is cheap.
 from pathlib import Path
-import pytesseract
 import numpy as np
 import json
 import time
 import os
-from PIL import ImageDraw
-import pandas as pd
-
-def erase_from_text_start(image, crop_percent=25, buffer_px=10, lang="dan", top_percent=15, right_percent=100, debug_save_path=None):
-    """Highlight areas with semi-transparent red/yellow directly on RGB image before erasing."""
-    import pytesseract
+import subprocess
+import sys
+import threading
+
+try:
+    from models import ocr_cache, ocr_engines, preprocessing, word_table
+except ImportError:  # run directly as a script from backend/models
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    from models import ocr_cache, ocr_engines, preprocessing, word_table
+import metrics
+import trigram_index
+
+# Number of processes used to OCR the pages of one PDF in parallel (1 = sequential)
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", "1"))
+# Rasterization settings; RASTER_WINDOW is how many pages are rendered into memory at once
+RASTER_DPI = int(os.environ.get("RASTER_DPI", "200"))
+RASTER_WINDOW = int(os.environ.get("RASTER_WINDOW", "1"))
+# A page's embedded text layer is used instead of OCR when it has at least this many
+# words and this share of alphanumeric characters (ignoring whitespace)
+TEXT_LAYER_MIN_WORDS = 20
+TEXT_LAYER_MIN_ALNUM_RATIO = 0.6
+# How the header of page 1 is blanked (see erase_from_text_start)
+PAGE1_BLANKING = {"crop_percent": 5, "buffer_px": 10, "top_percent": 15, "right_percent": 100}
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+def get_pool(workers):
+    """
+    A process pool with `workers` processes, kept for the life of this process so
+    its workers (and their OCR engines) are reused across PDFs. Workers are
+    spawned rather than forked: the pool is created from a job thread of a
+    multi-threaded server that already holds the embedding model, and forking
+    such a process can deadlock the child on a lock held by another thread.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    with _pool_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pools[workers]
+
+def erase_from_text_start(image, crop_percent=25, buffer_px=10, lang="dan", top_percent=15, right_percent=100, debug_save_path=None, return_ocr_data=False, engine=None):
+    """
+    Highlight areas with semi-transparent red/yellow directly on RGB image before erasing.
+    With return_ocr_data=True, returns (image, ocr_data) where ocr_data is this pass's
+    word table minus the words inside the blanked band, so the page need not be OCR'd again.
+    """
     from PIL import ImageDraw
 
-    ocr_data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DATAFRAME)
+    ocr_data = ocr_engines.get_engine(engine).image_to_data(image, lang)
     valid_data = ocr_data[(ocr_data.conf != -1) & (ocr_data.text.notna()) & (ocr_data.text.str.strip() != "")]
 
     if valid_data.empty:
         print("⚠️ No valid text detected. Skipping blanking.")
-        return image
+        return (image, ocr_data) if return_ocr_data else image
 
     width, height = image.size
     right_x_start = int(width * (1 - right_percent / 100))
@@ -38,7 +82,7 @@ def erase_from_text_start(image, crop_percent=25, buffer_px=10, lang="dan", top_
 
     if filtered_data.empty:
         print("⚠️ All text was in the exclusion zone. Skipping blanking.")
-        return image
+        return (image, ocr_data) if return_ocr_data else image
 
     start_y_raw = filtered_data['top'].min()
     erase_y_start = max(0, start_y_raw - buffer_px)
@@ -57,72 +101,216 @@ def erase_from_text_start(image, crop_percent=25, buffer_px=10, lang="dan", top_
     draw.rectangle([(0, erase_y_start), (width, erase_y_end)], fill="white")
 
     print(f"✂️ Blanked from Y={erase_y_start}px to Y={erase_y_end}px (text starts at Y={start_y_raw}, adjusted up by {buffer_px}px)")
+    if return_ocr_data:
+        # Drop the words whose vertical centre falls inside the whited-out band
+        centre_y = ocr_data.top + ocr_data.height / 2
+        ocr_data = ocr_data[~((centre_y >= erase_y_start) & (centre_y <= erase_y_end))]
+        return image, ocr_data
     return image
 
 
-def pdf_to_text(pdf_path, output_folder, lang="dan", include_confidence=True):
-    from pdf2image import convert_from_path
-    import numpy as np
-    import pytesseract
-    import json
-    import os
-    import time
+page_text_from_data = ocr_engines.page_text_from_data
 
-    images = convert_from_path(pdf_path)
-    extracted_text = ""
-    confidence_scores = []
 
-    output_folder.mkdir(parents=True, exist_ok=True)
-    start_time = time.time()
+def timed_ocr_pages(engine, images, lang="dan", include_confidence=True):
+    """ocr_pages for pool workers: returns ([(page_text, avg_confidence, words), ...], seconds) so the parent can record the timing."""
+    start = time.perf_counter()
+    pages = engine.ocr_pages(images, lang, include_confidence)
+    return pages, time.perf_counter() - start
 
-    total_pages = len(images)
-    progress_file = os.path.join("Files", "ProgressBar", "progress.json")
 
-    for i, image in enumerate(images):
-        if i == 0:
-            debug_image_path = output_folder / f"{pdf_path.stem}_page1_debug.png"
-            image = erase_from_text_start(image, crop_percent=5, buffer_px=10, lang=lang, debug_save_path=debug_image_path)
+def count_pdf_pages(pdf_path):
+    from pdf2image import pdfinfo_from_path
 
+    return pdfinfo_from_path(str(pdf_path))["Pages"]
 
 
-        if i == 0:
-            print(f"Saved page {i + 1} image to {debug_image_path}")
+def extract_text_layer(pdf_path, total_pages):
+    """
+    Read the embedded text of every page with poppler's pdftotext (installed with pdf2image).
+    Returns one whitespace-normalised string per page, or [] if the text layer can't be read.
+    """
+    try:
+        result = subprocess.run(["pdftotext", "-enc", "UTF-8", str(pdf_path), "-"], capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print("⚠️ Could not read embedded text layer:", e)
+        return []
+    pages = result.stdout.decode("utf-8", errors="replace").split("\f")
+    pages = [" ".join(page.split()) for page in pages[:total_pages]]
+    return pages + [""] * (total_pages - len(pages))
 
-        # OCR processing
-        if include_confidence:
-            ocr_data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DATAFRAME)
-            valid_data = ocr_data[ocr_data.conf != -1]
 
-            avg_confidence = np.mean(valid_data.conf) if not valid_data.empty else 0
-            confidence_scores.append(avg_confidence)
-            print(f"Page {i + 1}: Confidence Score = {avg_confidence:.2f}%")
+def has_usable_text(page_text):
+    words = page_text.split()
+    if len(words) < TEXT_LAYER_MIN_WORDS:
+        return False
+    chars = "".join(words)
+    alnum = sum(c.isalnum() for c in chars)
+    return alnum / len(chars) >= TEXT_LAYER_MIN_ALNUM_RATIO
 
-            page_text = " ".join(valid_data.text.dropna())
+
+def iter_pdf_pages(pdf_path, dpi=RASTER_DPI, grayscale=False, window=RASTER_WINDOW, total_pages=None, pages=None):
+    """
+    Rasterize `pdf_path` lazily, `window` pages at a time, yielding (page_index, image).
+    Peak memory depends on the window size instead of the page count, and OCR can
+    start as soon as the first page is rendered. `pages` limits rendering to the
+    given 0-based page indices.
+    """
+    from pdf2image import convert_from_path
+
+    if total_pages is None:
+        total_pages = count_pdf_pages(pdf_path)
+    if pages is None:
+        pages = range(total_pages)
+    window = max(1, window)
+
+    # Group the requested pages into runs of consecutive pages, at most `window` long
+    runs = []
+    for page in sorted(pages):
+        if runs and page == runs[-1][-1] + 1 and len(runs[-1]) < window:
+            runs[-1].append(page)
         else:
-            page_text = pytesseract.image_to_string(image, lang=lang)
-
-        extracted_text += f"\n--- Page {i + 1} ---\n{page_text}\n"
-
-        # Update progress
-        ocr_progress = round((i + 1) / total_pages, 4)
-        ocr_status = f"Behandler side {i + 1} af {total_pages}"
-
-        main_progress, main_status = 0.0, "Venter på scanning..."
-        if os.path.exists(progress_file):
-            try:
-                with open(progress_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    main_data = data.get("main", {})
-                    main_progress = main_data.get("progress", 0.0)
-                    main_status = main_data.get("status", "Venter på scanning...")
-            except Exception as e:
-                print("⚠️ Could not read existing main progress:", e)
-
-        with open(progress_file, "w", encoding="utf-8") as f:
-            json.dump({
-                "ocr": {"progress": ocr_progress, "status": ocr_status},
-                "main": {"progress": main_progress, "status": main_status}
-            }, f, ensure_ascii=False)
+            runs.append([page])
+
+    for run in runs:
+        with metrics.timed("rasterize"):
+            images = convert_from_path(pdf_path, dpi=dpi, grayscale=grayscale, first_page=run[0] + 1, last_page=run[-1] + 1)
+        for page, image in zip(run, images):
+            yield page, image
+
+
+def pdf_to_text(pdf_path, output_folder, lang="dan", include_confidence=True, workers=None,
+                dpi=RASTER_DPI, grayscale=False, window=RASTER_WINDOW, verify_ocr=False, use_text_layer=True,
+                progress_callback=None, engine=None, preprocess=None):
+    """
+    OCR every page of `pdf_path` into `<output_folder>/<stem>.txt`.
+    Pages are rasterized as a stream (see iter_pdf_pages). With `workers` > 1
+    (default: OCR_WORKERS) pages are spread over a process pool; the text is
+    still assembled in page order.
+    Page 1 reuses the word boxes from the blanking pass; set `verify_ocr` to
+    OCR the blanked image a second time instead.
+    With `use_text_layer`, pages that already carry a usable embedded text layer
+    are read directly and skip rasterization and OCR. Page 1 always goes through
+    OCR so its header can be blanked. The path used for each page is written to
+    `<output_folder>/<stem>_pages.json`.
+    `progress_callback(progress, status)` is called as pages finish.
+    `engine` is an OCR engine or engine name (see ocr_engines.get_engine); pages
+    are handed to it `engine.batch_pages` at a time.
+    Every rendered page first goes through the `preprocess` steps (see
+    models/preprocessing.py; default OCR_PREPROCESS).
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+
+    workers = OCR_WORKERS if workers is None else workers
+    engine = ocr_engines.get_engine(engine)
+    preprocess_steps = preprocessing.parse_steps(preprocess)
+
+    total_pages = count_pdf_pages(pdf_path)
+    page_texts = [None] * total_pages
+    page_confidences = [None] * total_pages
+    page_sources = ["ocr"] * total_pages
+    page_words = [None] * total_pages
+
+    output_folder.mkdir(parents=True, exist_ok=True)
+    start_time = time.time()
+
+    report_progress = progress_callback or (lambda progress, status: None)
+    debug_image_path = output_folder / f"{pdf_path.stem}_page1_debug.png"
+
+    def prepare_page(i, image):
+        """Returns (image, result); result is (page_text, avg_confidence, words) when no further OCR is needed."""
+        if i != 0:
+            return image, None
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        with metrics.timed("blank"):
+            image, ocr_data = erase_from_text_start(image, lang=lang, debug_save_path=debug_image_path,
+                                                    return_ocr_data=True, engine=engine, **PAGE1_BLANKING)
+        print(f"Saved page 1 image to {debug_image_path}")
+        if verify_ocr:
+            return image, None
+        page_text, avg_confidence = page_text_from_data(ocr_data)
+        return image, (page_text, avg_confidence if include_confidence else None, ocr_engines.page_words(ocr_data))
+
+    pages_done = 0
+
+    def page_done(i, page_text, avg_confidence, words=None):
+        nonlocal pages_done
+        pages_done += 1
+        page_texts[i] = page_text
+        page_confidences[i] = avg_confidence
+        page_words[i] = words
+        if avg_confidence is not None:
+            print(f"Page {i + 1}: Confidence Score = {avg_confidence:.2f}%")
+        report_progress(pages_done / total_pages, f"Behandler side {pages_done} af {total_pages}")
+
+    ocr_pages = list(range(total_pages))
+    if use_text_layer and total_pages > 1:
+        with metrics.timed("text_layer"):
+            text_layer = extract_text_layer(pdf_path, total_pages)
+        for i, page_text in enumerate(text_layer):
+            if i != 0 and has_usable_text(page_text):
+                page_sources[i] = "text_layer"
+                ocr_pages.remove(i)
+                metrics.increment("pages_text_layer")
+                page_done(i, page_text, None)
+        if len(ocr_pages) < total_pages:
+            print(f"Using embedded text for {total_pages - len(ocr_pages)} of {total_pages} pages")
+
+    pages = iter_pdf_pages(pdf_path, dpi=dpi, grayscale=grayscale, window=window, total_pages=total_pages, pages=ocr_pages)
+
+    def page_batches():
+        """Yield lists of (page_index, image) that still need OCR, engine.batch_pages at a time."""
+        batch = []
+        for i, image in pages:
+            if preprocess_steps:
+                with metrics.timed("preprocess"):
+                    image = preprocessing.preprocess(image, preprocess_steps, dpi)
+            image, result = prepare_page(i, image)
+            if result is not None:
+                page_done(i, *result)
+                continue
+            batch.append((i, image))
+            if len(batch) >= engine.batch_pages:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def batch_done(indices, results, seconds):
+        for i, result in zip(indices, results):
+            metrics.observe("ocr_page", seconds / len(indices))
+            page_done(i, *result)
+
+    if workers > 1 and len(ocr_pages) > 1:
+        # Keep only a couple of batches per worker in flight so the rasterizer
+        # does not run ahead of OCR and pile rendered pages up in memory.
+        max_in_flight = workers * 2
+        executor = get_pool(workers)
+        in_flight = {}
+
+        def drain(return_when):
+            done, _ = wait(in_flight, return_when=return_when)
+            for future in done:
+                results, seconds = future.result()
+                batch_done(in_flight.pop(future), results, seconds)
+
+        for batch in page_batches():
+            indices, images = zip(*batch)
+            in_flight[executor.submit(timed_ocr_pages, engine, list(images), lang, include_confidence)] = indices
+            if len(in_flight) >= max_in_flight:
+                drain(FIRST_COMPLETED)
+        while in_flight:
+            drain(FIRST_COMPLETED)
+    else:
+        for batch in page_batches():
+            indices, images = zip(*batch)
+            batch_done(indices, *timed_ocr_pages(engine, list(images), lang, include_confidence))
+
+    metrics.increment("pages_ocr", len(ocr_pages))
+
+    extracted_text, words = word_table.assemble(page_texts, page_words)
+    confidence_scores = [c for c in page_confidences if c is not None]
 
     # Save extracted text
     text_filename = pdf_path.stem + ".txt"
@@ -130,6 +318,19 @@ def pdf_to_text(pdf_path, output_folder, lang="dan", include_confidence=True):
     with text_file_path.open("w", encoding="utf-8") as text_file:
         text_file.write(extracted_text)
 
+    pages_file_path = output_folder / f"{pdf_path.stem}_pages.json"
+    with pages_file_path.open("w", encoding="utf-8") as pages_file:
+        json.dump([
+            {"page": i + 1, "source": source, "confidence": page_confidences[i]}
+            for i, source in enumerate(page_sources)
+        ], pages_file, ensure_ascii=False, indent=4)
+
+    # Word boxes, so matches in the text can be traced back to the page
+    word_table.save(words, word_table.words_path(text_file_path))
+
+    # Trigram index for literal field lookups, kept (and cached) with the text
+    trigram_index.save(trigram_index.build(extracted_text), trigram_index.index_path(text_file_path))
+
     elapsed_time = time.time() - start_time
 
     if include_confidence and confidence_scores:
@@ -139,26 +340,73 @@ def pdf_to_text(pdf_path, output_folder, lang="dan", include_confidence=True):
     print(f"{pdf_path.name} - Processing Time: {elapsed_time:.2f} seconds")
 
     # Final progress update
-    with open(progress_file, "w", encoding="utf-8") as f:
-        json.dump({
-            "ocr": {"progress": 1.0, "status": "Scanning færdig"},
-            "main": {"progress": main_progress, "status": main_status}
-        }, f, ensure_ascii=False)
-
-def process_all_pdfs(lang="dan", include_confidence=True):
+    report_progress(1.0, "Scanning færdig")
+
+def ocr_artifacts(pdf_file, output_folder):
+    """The files pdf_to_text writes for one PDF, by cache artifact name."""
+    output_folder = Path(output_folder)
+    return {
+        "text.txt": output_folder / f"{pdf_file.stem}.txt",
+        "page1_debug.png": output_folder / f"{pdf_file.stem}_page1_debug.png",
+        "pages.json": output_folder / f"{pdf_file.stem}_pages.json",
+        "trigrams.json": output_folder / f"{pdf_file.stem}_trigrams.json",
+        "words.npz": output_folder / f"{pdf_file.stem}_words.npz",
+    }
+
+def process_pdf(pdf_file, output_folder=Path("Files/Policer"), lang="dan", include_confidence=True, workers=None,
+                dpi=RASTER_DPI, grayscale=False, use_text_layer=True, verify_ocr=False, use_cache=True,
+                progress_callback=None, engine=None, preprocess=None):
+    """
+    OCR a single PDF and return the .txt path. Results are looked up in the
+    content-addressed OCR cache first, so a document is only OCR'd once per
+    set of OCR parameters no matter what the file is called. `engine` is an OCR
+    engine or engine name (default: ocr_engines.OCR_ENGINE), `preprocess` a
+    preprocessing spec (default: preprocessing.OCR_PREPROCESS).
+    """
+    pdf_file = Path(pdf_file)
+    artifacts = ocr_artifacts(pdf_file, output_folder)
+    engine = ocr_engines.get_engine(engine)
+    preprocess = preprocessing.describe(preprocessing.parse_steps(preprocess))
+
+    key = None
+    if use_cache:
+        key = ocr_cache.cache_key(pdf_file, {
+            "lang": lang,
+            "include_confidence": include_confidence,
+            "dpi": dpi,
+            "grayscale": grayscale,
+            "use_text_layer": use_text_layer,
+            "verify_ocr": verify_ocr,
+            "page1_blanking": PAGE1_BLANKING,
+            "engine": engine.cache_params(),
+            "preprocess": preprocess,
+        })
+        if ocr_cache.restore(key, artifacts):
+            metrics.increment("ocr_cache_hit")
+            print(f"Skipping {pdf_file.name} (found in OCR cache)")
+            return artifacts["text.txt"]
+        metrics.increment("ocr_cache_miss")
+
+    print(f"\nProcessing {pdf_file.name}...")
+    # Drop files an earlier PDF with the same stem left, so they are neither
+    # read with this text nor stored in this PDF's cache entry
+    for path in artifacts.values():
+        path.unlink(missing_ok=True)
+    pdf_to_text(pdf_file, Path(output_folder), lang=lang, include_confidence=include_confidence, workers=workers,
+                dpi=dpi, grayscale=grayscale, use_text_layer=use_text_layer, verify_ocr=verify_ocr,
+                progress_callback=progress_callback, engine=engine, preprocess=preprocess)
+    if key is not None:
+        ocr_cache.store(key, artifacts)
+    return artifacts["text.txt"]
+
+def process_all_pdfs(lang="dan", include_confidence=True, workers=None, engine=None):
     input_folder = Path("Files/policer-Raw")
     output_folder = Path("Files/Policer")
 
     for pdf_file in input_folder.glob("*.pdf"):
-        output_text_file = output_folder / (pdf_file.stem + ".txt")
-        if output_text_file.exists():
-            print(f"Skipping {pdf_file.name} (already extracted)")
-        else:
-            print(f"\nProcessing {pdf_file.name}...")
-            pdf_to_text(pdf_file, output_folder, lang=lang, include_confidence=include_confidence)
-
-# Run script
-input_folder = Path("Files/policer-Raw")
-output_folder = Path("Files/Policer")
+        process_pdf(pdf_file, output_folder, lang=lang, include_confidence=include_confidence, workers=workers,
+                    engine=engine)
 
-process_all_pdfs(lang="dan", include_confidence=True)
+# Run script: python models/tesseractocr.py [engine]
+if __name__ == "__main__":
+    process_all_pdfs(lang="dan", include_confidence=True, engine=sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,144 @@
+# Word-level OCR output, stored next to the text as <stem>_words.npz: one row
+# per word (or EasyOCR text box) with its page, pixel box, confidence and its
+# [char_start, char_end) span in <stem>.txt. Columns are plain NumPy arrays;
+# the word strings are one UTF-8 blob plus offsets, so nothing is pickled.
+# The .npz is written uncompressed, so load() can memory-map every column
+# straight out of the file instead of copying it.
+import os
+import re
+import zipfile
+import numpy as np
+
+# Words without a box (pages read from the PDF's text layer) have -1 coordinates
+NO_BOX = -1
+_token_re = re.compile(r"\S+")
+
+def page_header(page_number):
+    return f"\n--- Page {page_number} ---\n"
+
+def assemble(page_texts, page_words):
+    """
+    Build the document text (the .txt content) and its word table.
+    `page_words` holds, per page, a word table DataFrame (columns text, conf,
+    left, top, width, height) in the order the words appear in the page text,
+    or None to take the page's whitespace-separated tokens without boxes.
+    Returns (text, table).
+    """
+    parts = []
+    columns = {name: [] for name in ("page", "left", "top", "width", "height", "conf", "char_start", "char_end")}
+    texts = []
+    offset = 0
+    for i, (page_text, words) in enumerate(zip(page_texts, page_words)):
+        header = page_header(i + 1)
+        page_text = page_text or ""
+        parts.extend([header, page_text, "\n"])
+        base = offset + len(header)
+        if words is None:
+            rows = [(match.group(), match.start(), NO_BOX, NO_BOX, NO_BOX, NO_BOX, -1.0)
+                    for match in _token_re.finditer(page_text)]
+        else:
+            rows = []
+            cursor = 0
+            for text, left, top, width, height, conf in zip(words.text, words.left, words.top,
+                                                             words.width, words.height, words.conf):
+                text = str(text)
+                start = page_text.find(text, cursor)
+                if start < 0:
+                    continue
+                cursor = start + len(text)
+                rows.append((text, start, left, top, width, height, conf))
+        for text, start, left, top, width, height, conf in rows:
+            texts.append(text)
+            columns["page"].append(i + 1)
+            columns["left"].append(left)
+            columns["top"].append(top)
+            columns["width"].append(width)
+            columns["height"].append(height)
+            columns["conf"].append(conf)
+            columns["char_start"].append(base + start)
+            columns["char_end"].append(base + start + len(text))
+        offset = base + len(page_text) + 1
+
+    encoded = [text.encode("utf-8") for text in texts]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=text_offsets[1:])
+    table = {
+        "page": np.asarray(columns["page"], dtype=np.int16),
+        "left": np.asarray(columns["left"], dtype=np.int32),
+        "top": np.asarray(columns["top"], dtype=np.int32),
+        "width": np.asarray(columns["width"], dtype=np.int32),
+        "height": np.asarray(columns["height"], dtype=np.int32),
+        "conf": np.asarray(columns["conf"], dtype=np.float32),
+        "char_start": np.asarray(columns["char_start"], dtype=np.int64),
+        "char_end": np.asarray(columns["char_end"], dtype=np.int64),
+        "text_offsets": text_offsets,
+        "text_bytes": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+    }
+    return "".join(parts), table
+
+_header_readers = {
+    (1, 0): np.lib.format.read_array_header_1_0,
+    (2, 0): np.lib.format.read_array_header_2_0,
+}
+
+def words_path(text_path):
+    return f"{os.path.splitext(str(text_path))[0]}_words.npz"
+
+def save(table, path):
+    # Uncompressed so the columns can be memory-mapped by load()
+    np.savez(path, **table)
+
+def load(path, mmap=True):
+    """
+    The word table at `path` as {column: array}. With `mmap` every column is a
+    read-only memory map into the file (no copy); otherwise arrays are read into memory.
+    """
+    if not mmap:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    table = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            # The member's data starts after its local file header
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_length = int.from_bytes(local_header[26:28], "little")
+            extra_length = int.from_bytes(local_header[28:30], "little")
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            name = info.filename[:-4]
+            if info.compress_type != zipfile.ZIP_STORED or version not in _header_readers:
+                raise ValueError(f"{path}: column {name} cannot be memory-mapped")
+            shape, fortran_order, dtype = _header_readers[version](f)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: column {name} cannot be memory-mapped")
+            if not shape or 0 in shape:
+                table[name] = np.zeros(shape, dtype=dtype)
+            else:
+                table[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                        order="F" if fortran_order else "C")
+    return table
+
+def word_text(table, row):
+    start, end = table["text_offsets"][row], table["text_offsets"][row + 1]
+    return bytes(table["text_bytes"][start:end]).decode("utf-8")
+
+def locate(table, char_start, char_end):
+    """
+    Where the text span [char_start, char_end) sits on the page: the union box
+    of the words it overlaps (on the first of their pages), as
+    {"page", "left", "top", "width", "height"}, or None if no word has a box.
+    """
+    first = int(np.searchsorted(table["char_end"], char_start, side="right"))
+    last = int(np.searchsorted(table["char_start"], char_end, side="left"))
+    rows = np.arange(first, last)
+    rows = rows[table["left"][rows] != NO_BOX]
+    if not len(rows):
+        return None
+    rows = rows[table["page"][rows] == table["page"][rows[0]]]
+    left = int(table["left"][rows].min())
+    top = int(table["top"][rows].min())
+    right = int((table["left"][rows] + table["width"][rows]).max())
+    bottom = int((table["top"][rows] + table["height"][rows]).max())
+    return {"page": int(table["page"][rows[0]]), "left": left, "top": top, "width": right - left, "height": bottom - top}
@@ -0,0 +1,100 @@
+import re
+from rapidfuzz import fuzz
+import metrics
+import chunking
+
+# Single-pass extractor for number-with-unit fields (areaSize). Instead of six
+# embedded queries (m2/m?/kvm x prefix/suffix) searched in every config, the
+# OCR token stream is scanned once for every area quantity and the candidates
+# are ranked against the expected value by their digits. No model is involved.
+
+# Area units as they come out of OCR: tesseract often reads "m²" as "m?" or
+# "m?2", and "kvm" as "kvrn"
+UNIT = r"(?:m²|m2|m\?2?|m'2|mz|kvm|kvrn|kv\.m)"
+_unit_re = re.compile(rf"^{UNIT}$", re.IGNORECASE)
+_number_re = re.compile(r"^\d[\d.,]*$")
+_glued_re = re.compile(rf"^(\d[\d.,]*)({UNIT})$", re.IGNORECASE)
+_strip = "()[]:;,."
+EXCERPT_TOKENS = 10
+
+def parse_number(text):
+    """'1.250' -> 1250.0, '152,5' -> 152.5, '162' -> 162.0; None if it isn't a number."""
+    text = text.strip(".,")
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", text):
+        text = text.replace(".", "")
+    try:
+        return float(text.replace(",", "."))
+    except ValueError:
+        return None
+
+def find_quantities(tokens):
+    """
+    Every number-with-unit occurrence in `tokens` (the OCR text split on
+    whitespace), as dicts with value, number (as written), text,
+    unit_position ("suffix"/"prefix") and the [start, end) token span.
+    "162 kvm", "162m2" and "m2 162" are found; a number is only used once,
+    preferring the unit that follows it.
+    """
+    quantities = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i].strip(_strip)
+        following = tokens[i + 1].strip(_strip) if i + 1 < len(tokens) else ""
+        glued = _glued_re.match(token)
+        if glued:
+            found = (glued.group(1), "suffix", i, i + 1)
+        elif _number_re.match(token) and _unit_re.match(following):
+            found = (token, "suffix", i, i + 2)
+        elif _unit_re.match(token) and _number_re.match(following):
+            found = (following, "prefix", i, i + 2)
+        else:
+            found = None
+        if found:
+            number, unit_position, start, end = found
+            value = parse_number(number)
+            if value is not None:
+                quantities.append({
+                    "value": value,
+                    "number": number.strip(".,"),
+                    "text": " ".join(tokens[start:end]),
+                    "unit_position": unit_position,
+                    "start": start,
+                    "end": end,
+                })
+                i = end
+                continue
+        i += 1
+    return quantities
+
+def score_quantity(expected, quantity):
+    """100 for the same number, otherwise how close the digits are (catches OCR digit errors)."""
+    expected_value = parse_number(expected)
+    if expected_value is not None:
+        if quantity["value"] == expected_value:
+            return 100.0
+        return fuzz.ratio(f"{expected_value:g}", f"{quantity['value']:g}")
+    # Not a number (e.g. a typo like "19S"); compare as written
+    return fuzz.ratio(expected, quantity["number"])
+
+def match_area(text, expected):
+    """
+    Best area quantity in `text` (a string or chunking.Tokens) for the expected
+    area size. Returns (candidate, score, None, excerpt, char_span) like
+    run_search_for_config's results, or None if the text holds no area quantity
+    or there is no expected value. Ties go to the first occurrence.
+    """
+    expected = str(expected).strip() if expected is not None else ""
+    if not expected:
+        return None
+    with metrics.timed("numeric"):
+        tokens = chunking.tokenize(text)
+        words = tokens.words
+        best, best_score = None, -1
+        for quantity in find_quantities(words):
+            score = score_quantity(expected, quantity)
+            if score > best_score:
+                best, best_score = quantity, score
+    if best is None:
+        return None
+    excerpt = " ".join(words[max(0, best["start"] - EXCERPT_TOKENS):best["end"] + EXCERPT_TOKENS])
+    return best["text"], best_score, None, excerpt, tokens.char_span(best["start"], best["end"])
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+import copy
+import threading
+
+# In-memory progress channel, one entry per job. Replaces the shared
+# Files/ProgressBar/progress.json so concurrent jobs no longer overwrite each
+# other and nothing is written to disk on every page.
+
+NOT_STARTED = {
+    "ocr": {"progress": 0.0, "status": "Ikke startet"},
+    "main": {"progress": 0.0, "status": "Ikke startet"}
+}
+# How many finished or failed jobs are kept around for late subscribers and polling
+MAX_FINISHED_JOBS = 1000
+
+_changed = threading.Condition()
+_jobs = {}
+_versions = {}
+_finished = OrderedDict()
+
+def _publish(job_id):
+    """Bump the job's version and wake subscribers; call with _changed held."""
+    _versions[job_id] = _versions.get(job_id, 0) + 1
+    if is_done(_jobs[job_id]):
+        _finished[job_id] = None
+        _finished.move_to_end(job_id)
+        while len(_finished) > MAX_FINISHED_JOBS:
+            old_job_id, _ = _finished.popitem(last=False)
+            _jobs.pop(old_job_id, None)
+            _versions.pop(old_job_id, None)
+    else:
+        _finished.pop(job_id, None)
+    _changed.notify_all()
+
+def reset(job_id, ocr_status="Starter scanning...", main_status="Venter på scanning..."):
+    with _changed:
+        _jobs[job_id] = {
+            "ocr": {"progress": 0.0, "status": ocr_status},
+            "main": {"progress": 0.0, "status": main_status}
+        }
+        _publish(job_id)
+
+def update(job_id, stage, progress, status=""):
+    """Set the progress (0-1) and status text of one stage ("ocr" or "main") of a job."""
+    if job_id is None:
+        return
+    with _changed:
+        job = _jobs.setdefault(job_id, copy.deepcopy(NOT_STARTED))
+        job[stage] = {"progress": round(progress, 4), "status": status}
+        # A new run of a previously failed job
+        job.pop("error", None)
+        _publish(job_id)
+
+def fail(job_id, error, status="Fejlet"):
+    """Mark a job as failed: unfinished stages get `status` and the state carries the error message."""
+    with _changed:
+        job = _jobs.setdefault(job_id, copy.deepcopy(NOT_STARTED))
+        for stage in ("ocr", "main"):
+            if job[stage]["progress"] < 1.0:
+                job[stage]["status"] = status
+        job["error"] = error
+        _publish(job_id)
+
+def snapshot(job_id):
+    """Current progress of a job, or None if nothing has been reported for it."""
+    with _changed:
+        job = _jobs.get(job_id)
+        return copy.deepcopy(job) if job is not None else None
+
+def is_finished(state):
+    return state["ocr"]["progress"] >= 1.0 and state["main"]["progress"] >= 1.0
+
+def is_done(state):
+    """True once nothing more will be reported: the job finished or failed."""
+    return is_finished(state) or "error" in state
+
+def subscribe(job_id, keepalive=15.0):
+    """
+    Yield a job's progress every time it changes, starting with its current state.
+    Yields None when nothing changed for `keepalive` seconds so callers can send
+    a heartbeat. Stops after the job reports both stages finished or fails
+    (the state then has an "error").
+    """
+    seen = -1
+    while True:
+        with _changed:
+            _changed.wait_for(lambda: _versions.get(job_id, 0) != seen, timeout=keepalive)
+            version = _versions.get(job_id, 0)
+            state = copy.deepcopy(_jobs.get(job_id, NOT_STARTED))
+        if version == seen:
+            yield None
+            continue
+        seen = version
+        yield state
+        if is_done(state):
+            return
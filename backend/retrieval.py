@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import metrics
+
+# "auto" uses NumPy brute force below FAISS_MIN_CHUNKS chunks and FAISS above it.
+# FAISS is effectively opt-in: one policy yields a few hundred to a few thousand
+# chunks, far below the default threshold, and NumPy was faster at every size
+# benchmarks/retrieval_crossover.py measured. Set RETRIEVAL_BACKEND=faiss, or
+# FAISS_MIN_CHUNKS to the crossover that benchmark reports on your machine.
+RETRIEVAL_BACKEND = os.environ.get("RETRIEVAL_BACKEND", "auto")
+FAISS_MIN_CHUNKS = int(os.environ.get("FAISS_MIN_CHUNKS", "200000"))
+
+def numpy_search(chunk_embeddings, query_embeddings, top_k):
+    """
+    Exact L2 search of all queries against all chunks in one matrix multiply.
+    Returns (distances, idxs) shaped (n_queries, top_k), nearest first, with the
+    same squared-L2 distances as faiss.IndexFlatL2.
+    """
+    chunk_norms = np.einsum('ij,ij->i', chunk_embeddings, chunk_embeddings)
+    query_norms = np.einsum('ij,ij->i', query_embeddings, query_embeddings)
+    distances = query_norms[:, None] + chunk_norms[None, :] - 2.0 * (query_embeddings @ chunk_embeddings.T)
+    np.maximum(distances, 0, out=distances)
+
+    if top_k < distances.shape[1]:
+        idxs = np.argpartition(distances, top_k - 1, axis=1)[:, :top_k]
+    else:
+        idxs = np.broadcast_to(np.arange(distances.shape[1]), distances.shape)
+    top_distances = np.take_along_axis(distances, idxs, axis=1)
+    order = np.argsort(top_distances, axis=1, kind='stable')
+    return np.take_along_axis(top_distances, order, axis=1), np.take_along_axis(idxs, order, axis=1)
+
+def faiss_search(chunk_embeddings, query_embeddings, top_k):
+    import faiss
+
+    with metrics.timed("index"):
+        index = faiss.IndexFlatL2(chunk_embeddings.shape[1])
+        index.add(chunk_embeddings)
+    return index.search(query_embeddings, top_k)
+
+def choose_backend(n_chunks, backend=None):
+    backend = backend or RETRIEVAL_BACKEND
+    if backend == "auto":
+        return "faiss" if n_chunks >= FAISS_MIN_CHUNKS else "numpy"
+    if backend not in ("numpy", "faiss"):
+        raise ValueError(f"Unknown retrieval backend: {backend}")
+    return backend
+
+def search(chunk_embeddings, query_embeddings, top_k, backend=None):
+    """
+    Find the `top_k` nearest chunks for every query. `top_k` is capped at the
+    number of chunks, so every returned index is valid.
+    """
+    chunk_embeddings = np.ascontiguousarray(chunk_embeddings, dtype='float32')
+    query_embeddings = np.ascontiguousarray(query_embeddings, dtype='float32').reshape(-1, chunk_embeddings.shape[1])
+    top_k = min(top_k, len(chunk_embeddings))
+    if choose_backend(len(chunk_embeddings), backend) == "faiss":
+        return faiss_search(chunk_embeddings, query_embeddings, top_k)
+    return numpy_search(chunk_embeddings, query_embeddings, top_k)
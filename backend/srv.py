@@ -1,15 +1,54 @@
 ﻿# -*- coding: utf-8 -*-
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask import send_from_directory
-import subprocess
 import json
 import os
+import threading
+import jobs
+import metrics
+import progress
 
 app = Flask(__name__)
 app.config["JSON_AS_ASCII"] = False
 CORS(app)
 
+def warm_up_worker():
+    # Load the pipeline module and the SentenceTransformer once, so jobs run warm
+    import main as pipeline
+    pipeline.get_model()
+
+def job_key(filename):
+    """Progress and jobs are keyed by the document's stem."""
+    return os.path.splitext(os.path.basename(filename))[0]
+
+def output_path(filename):
+    return f"Files/Output/{job_key(filename)}.json"
+
+def stored_output(filename):
+    """The document's stored output rows, or None if it has not been processed yet."""
+    path = output_path(filename)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def run_extraction(filename):
+    import main as pipeline
+    try:
+        # Guards against a duplicate run when another job produced the output
+        # after this one was queued
+        if not os.path.exists(output_path(filename)):
+            pipeline.run_pipeline(filename)
+        result = stored_output(filename)
+        if result is None:
+            raise FileNotFoundError("Output file not found")
+        return result
+    except Exception as e:
+        # Ends the progress stream of everyone waiting on this document
+        progress.fail(job_key(filename), str(e))
+        raise
+
 @app.route('/pdf/<path:filename>')
 def serve_pdf(filename):
     pdf_dir = os.path.join(os.path.dirname(app.root_path), 'Files', 'policer-Raw')
@@ -25,21 +64,68 @@ def serve_debug_image(filename):
 
 @app.route("/run-script", methods=["POST"])
 def run_script():
+    """Blocking variant of POST /jobs: waits for the (possibly shared) job and returns its result."""
     data = request.get_json()
     filename = data.get("filename")
     if not filename:
         return jsonify({"error": "Filename not provided"}), 400
 
-    output_path = f"Files/Output/{os.path.splitext(filename)[0]}.json"
-    if not os.path.exists(output_path):
-        subprocess.run(["python", "backend/main.py", filename])
+    # An already processed document is answered from its stored output without queueing
+    stored = stored_output(filename)
+    if stored is not None:
+        return jsonify(stored)
+
+    job_id, _ = jobs.submit(job_key(filename), run_extraction, filename)
+    try:
+        return jsonify(jobs.wait(job_id))
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        return jsonify({"error": f"Extraction failed: {e}"}), 500
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename")
+    if not filename:
+        return jsonify({"error": "Filename not provided"}), 400
+
+    stored = stored_output(filename)
+    if stored is not None:
+        # Recorded as a finished job so /jobs/<id> works the same either way
+        job_id = jobs.record_done(job_key(filename), stored)
+        return jsonify({"job_id": job_id, "joined": False, **jobs.stats()}), 200
+
+    job_id, joined = jobs.submit(job_key(filename), run_extraction, filename)
+    return jsonify({"job_id": job_id, "joined": joined, **jobs.stats()}), 202
+
+def run_batch(filenames):
+    import main as pipeline
+    return pipeline.process_batch(pipeline.resolve_documents(filenames))
+
+@app.route("/batch", methods=["POST"])
+def submit_batch():
+    """Queue a list of documents as one pipelined batch job; poll /jobs/<id> for the consolidated result."""
+    data = request.get_json(silent=True) or {}
+    filenames = data.get("filenames")
+    if not filenames or not isinstance(filenames, list):
+        return jsonify({"error": "filenames must be a non-empty list"}), 400
 
-    if os.path.exists(output_path):
-        with open(output_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return jsonify(data)
-    else:
-        return jsonify({"error": "Output file not found"}), 500
+    key = "batch:" + ",".join(sorted(job_key(filename) for filename in filenames))
+    job_id, joined = jobs.submit(key, run_batch, filenames, queue="batch")
+    return jsonify({"job_id": job_id, "joined": joined, "documents": len(filenames), **jobs.stats()}), 202
+
+@app.route("/jobs", methods=["GET"])
+def job_stats():
+    return jsonify(jobs.stats())
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    job["progress"] = progress.snapshot(job["key"]) or progress.NOT_STARTED
+    return jsonify(job)
 
 @app.route("/list-files", methods=["GET"])
 def list_files():
@@ -49,48 +135,71 @@ def list_files():
     file_list = os.listdir(folder_path)
     return jsonify(file_list)
 
+FINISHED = {
+    "ocr": {"progress": 1.0, "status": "Scanning Færdig"},
+    "main": {"progress": 1.0, "status": "Færdig"}
+}
+
+def current_progress(filename):
+    if os.path.exists(output_path(filename)):
+        return FINISHED
+    return progress.snapshot(job_key(filename)) or progress.NOT_STARTED
+
 @app.route("/progress", methods=["GET"])
 def get_progress():
     filename = request.args.get("filename")
     if not filename:
-        return jsonify({
-            "ocr": {"progress": 0.0, "status": "Ikke startet"},
-            "main": {"progress": 0.0, "status": "Ikke startet"}
-        })
-
-    output_path = f"Files/Output/{os.path.splitext(filename)[0]}.json"
-    if os.path.exists(output_path):
-        return jsonify({
-            "ocr": {"progress": 1.0, "status": "Scanning Færdig"},
-            "main": {"progress": 1.0, "status": "Færdig"}
-        })
-
-    progress_file = os.path.join("Files", "ProgressBar", "progress.json")
-    if not os.path.exists(progress_file):
-        return jsonify({
-            "ocr": {"progress": 0.0, "status": "Ikke startet"},
-            "main": {"progress": 0.0, "status": "Ikke startet"}
-        })
+        return jsonify(progress.NOT_STARTED)
 
-    try:
-        with open(progress_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            ocr_progress = data.get("ocr", {"progress": 0.0, "status": ""})
-            main_progress = data.get("main", {"progress": 0.0, "status": ""})
-            return jsonify({"ocr": ocr_progress, "main": main_progress})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return jsonify(current_progress(filename))
+
+@app.route("/progress/stream", methods=["GET"])
+def stream_progress():
+    """Server-Sent Events: pushes the job's progress every time it changes."""
+    filename = request.args.get("filename")
+    if not filename:
+        return jsonify({"error": "Filename not provided"}), 400
+
+    def events():
+        if current_progress(filename) is FINISHED:
+            yield f"data: {json.dumps(FINISHED, ensure_ascii=False)}\n\n"
+            return
+        for state in progress.subscribe(job_key(filename)):
+            if state is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"data: {json.dumps(state, ensure_ascii=False)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/reset-progress", methods=["POST"])
 def reset_progress():
-    progress_file = os.path.join("Files", "ProgressBar", "progress.json")
-    os.makedirs(os.path.dirname(progress_file), exist_ok=True)
-    with open(progress_file, "w", encoding="utf-8") as f:
-        json.dump({
-            "ocr": {"progress": 0.0, "status": "Starter scanning..."},
-            "main": {"progress": 0.0, "status": "Venter på scanning..."}
-        }, f, ensure_ascii=False)
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename")
+    if not filename:
+        return jsonify({"error": "Filename not provided"}), 400
+    progress.reset(job_key(filename))
     return jsonify({"status": "reset"}), 200
 
+@app.route("/jobs/<job_id>/trace", methods=["GET"])
+def get_job_trace(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job_id": job_id, "key": job["key"], "stages": metrics.trace(job_id)})
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Stage histograms, event counters and job queue gauges in Prometheus text format."""
+    queue = jobs.stats()
+    gauges = {
+        "pipeline_job_queue_depth": queue["queue_depth"],
+        "pipeline_jobs_running": queue["running"],
+        "pipeline_job_avg_wait_seconds": queue["avg_wait_seconds"],
+    }
+    return Response(metrics.render_prometheus(gauges), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    threading.Thread(target=warm_up_worker, daemon=True).start()
     app.run(port=5000)
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import numpy as np
+from rapidfuzz import fuzz
+import metrics
+import chunking
+
+# Character trigram inverted index over a document's OCR tokens, for the
+# literal fields (street + house number, postal code + district). Query windows
+# are found by trigram overlap and only the best ones are scored with
+# fuzz.ratio, so these fields need no embeddings. The index is written next to
+# the OCR text as <stem>_trigrams.json.
+
+N = 3
+# How many of the best-overlapping windows are scored with fuzz.ratio
+CANDIDATES = int(os.environ.get("TRIGRAM_CANDIDATES", "20"))
+EXCERPT_TOKENS = 15
+
+def trigrams(token):
+    """The character trigrams of a lowercased, punctuation-free token, padded so short tokens still have some."""
+    padded = f" {token} "
+    return {padded[i:i + N] for i in range(max(1, len(padded) - N + 1))}
+
+def text_digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def build(text):
+    """
+    Index `text` (a string or chunking.Tokens):
+    {"text_sha1", "postings": {trigram: [token positions]}, "tokens": chunking.Tokens}.
+    """
+    with metrics.timed("trigram_index"):
+        tokens = chunking.tokenize(text)
+        postings = {}
+        for position, token in enumerate(tokens.clean_words):
+            for gram in trigrams(token.lower()):
+                postings.setdefault(gram, []).append(position)
+    return {"text_sha1": text_digest(tokens.text), "postings": postings, "tokens": tokens}
+
+def save(index, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"n": N, "text_sha1": index["text_sha1"], "postings": index["postings"]}, f, ensure_ascii=False)
+
+def load(path, text):
+    """
+    The saved index for `text` (a string or chunking.Tokens), or a freshly
+    built one if there is no saved index or it was built from a different text.
+    """
+    tokens = chunking.tokenize(text)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        stored = None
+    if not stored or stored.get("n") != N or stored.get("text_sha1") != text_digest(tokens.text):
+        index = build(tokens)
+        save(index, path)
+        return index
+    return {"text_sha1": stored["text_sha1"], "postings": stored["postings"], "tokens": tokens}
+
+def index_path(text_path):
+    text_path = str(text_path)
+    return f"{os.path.splitext(text_path)[0]}_trigrams.json"
+
+def search(index, query, candidates=CANDIDATES):
+    """
+    Best window of the query's length for `query`, scored the same way as
+    main.find_best_substring_in_chunks (fuzz.ratio without punctuation).
+    Returns (substring, score, excerpt, char_span), char_span being the
+    substring's [start, end) character offsets in the text, or
+    (None, -1, None, None) if no window shares a trigram with the query.
+    """
+    with metrics.timed("trigram_search"):
+        query_clean = chunking.remove_punctuation(query)
+        query_tokens = query_clean.split()
+        query_len = len(query_tokens)
+        n_windows = len(index["tokens"]) - query_len + 1
+        if not query_tokens or n_windows <= 0:
+            return None, -1, None, None
+
+        # Every token scores how many of the query's trigrams it contains; a
+        # window scores the sum over its tokens
+        hits = np.zeros(len(index["tokens"]), dtype=np.int32)
+        for gram in set().union(*(trigrams(t.lower()) for t in query_tokens)):
+            positions = index["postings"].get(gram)
+            if positions:
+                hits[positions] += 1
+        cumulative = np.concatenate(([0], np.cumsum(hits)))
+        window_hits = cumulative[query_len:] - cumulative[:n_windows]
+        if not window_hits.any():
+            return None, -1, None, None
+
+        if candidates < n_windows:
+            starts = np.argpartition(-window_hits, candidates - 1)[:candidates]
+        else:
+            starts = np.arange(n_windows)
+        starts = np.sort(starts[window_hits[starts] > 0])
+
+        clean_words = index["tokens"].clean_words
+        best_start, best_score = None, -1
+        for start in starts.tolist():
+            score = fuzz.ratio(query_clean, " ".join(clean_words[start:start + query_len]))
+            if score > best_score:
+                best_start, best_score = start, score
+
+    tokens = index["tokens"]
+    substring = tokens.join(best_start, best_start + query_len)
+    excerpt = tokens.join(max(0, best_start - EXCERPT_TOKENS), best_start + query_len + EXCERPT_TOKENS)
+    return substring, best_score, excerpt, tokens.char_span(best_start, best_start + query_len)
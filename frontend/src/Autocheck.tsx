@@ -43,11 +43,22 @@ const Home: React.FC = () => {
     brandpoliceIsGreen, true, true, true, true, true
   ];
 
-  // Poll progress from backend, then navigate with data when done
-  const pollProgress = async () => {
-    try {
-      const res = await fetch(`http://localhost:5000/progress?filename=${filename}`);
-      const data = await res.json();
+  // Subscribe to pushed progress updates, then navigate with data when done
+  const listenForProgress = () => {
+    const source = new EventSource(`http://localhost:5000/progress/stream?filename=${filename}`);
+
+    source.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+
+      // The backend reports a failed extraction as a final state with an error
+      if (data.error) {
+        console.error("Extraction failed:", data.error);
+        source.close();
+        setOcrStatus(data.ocr?.status || "");
+        setMainStatus(data.main?.status || "");
+        setIsLoading(false);
+        return;
+      }
 
       const ocrProg = Math.round((data.ocr?.progress || 0) * 100);
       const mainProg = Math.round((data.main?.progress || 0) * 100);
@@ -58,17 +69,21 @@ const Home: React.FC = () => {
       setMainStatus(data.main?.status || "");
 
       if (ocrProg === 100 && mainProg === 100) {
+        source.close();
         setTimeout(() => {
           setIsLoading(false);
           const finalRows = updatedRowsRef.current;
           navigate("/revision", { state: { filename, rows: finalRows } });
         }, 1000);
-      } else {
-        setTimeout(pollProgress, 200);
       }
-    } catch (err) {
-      console.error("Error polling progress:", err);
-    }
+    };
+
+    source.onerror = (err) => {
+      console.error("Error streaming progress:", err);
+      source.close();
+    };
+
+    return source;
   };
 
   // Start the Brandpolice process
@@ -79,8 +94,12 @@ const Home: React.FC = () => {
     setOcrStatus("Starter...");
     setMainStatus("Venter på scanning...");
 
-    await fetch("http://localhost:5000/reset-progress", { method: "POST" });
-    pollProgress();
+    await fetch("http://localhost:5000/reset-progress", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ filename }),
+    });
+    const source = listenForProgress();
 
     try {
       const response = await fetch("http://localhost:5000/run-script", {
@@ -91,6 +110,8 @@ const Home: React.FC = () => {
       const data = await response.json();
       if (data.error) {
         console.error("Backend error:", data.error);
+        source.close();
+        setIsLoading(false);
         return;
       }
 
@@ -103,6 +124,8 @@ const Home: React.FC = () => {
       updatedRowsRef.current = updatedRows;
     } catch (error) {
       console.error("Failed to trigger Python script:", error);
+      source.close();
+      setIsLoading(false);
     }
   };
 